@@ -0,0 +1,503 @@
+"""Async versions of the crud functions for the routers (AsyncSession).
+
+The background services (outbox dispatcher, drip scheduler) keep using the
+synchronous functions in crud.py on their own thread.
+"""
+from datetime import datetime
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+from sqlalchemy import select, func, insert, update, delete, literal, cast, case, values, column, union_all, text, Text, String, Integer, Boolean
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from models import (
+    LeadMagnet, Lead, LandingPage, EmailTemplate, UpgradeOffer,
+    EmailOutbox, OutboxStatusEnum, LeadSequence, LeadEmail, leads_id_seq,
+    LeadMagnetStats, LeadMagnetStatsDelta,
+)
+from statements import lead_sequence_upsert, stats_bucket, stats_delta_insert
+import schemas
+from pagination import keyset_page
+
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+async def _save(db: AsyncSession, obj):
+    db.add(obj)
+    await db.commit()
+    await db.refresh(obj)
+    return obj
+async def _delete(db: AsyncSession, obj) -> bool:
+    if not obj:
+        return False
+    await db.delete(obj)
+    await db.commit()
+    return True
+async def _bulk_create(db: AsyncSession, model, rows: List[Dict]) -> List:
+    """One multi-row INSERT ... RETURNING and one commit, objects come back in rows order"""
+    if not rows:
+        return []
+    result = await db.scalars(insert(model).returning(model, sort_by_parameter_order=True), rows)
+    created = result.all()
+    await db.commit()
+    return created
+def _landing_page_values(landing_page: schemas.LandingPageCreate) -> Dict:
+    return {
+        "lead_magnet_id": landing_page.lead_magnet_id,
+        "headline": landing_page.headline,
+        "value": landing_page.value,
+        "cta": landing_page.cta,
+        "form_field": landing_page.from_field,
+        "thank_you_page": landing_page.thank_you_page,
+    }
+
+# ==================== LEAD MAGNETS ====================
+
+# Create a new lead magnet
+async def create_lead_magnet(db: AsyncSession, lead_magnet: schemas.LeadMagnetCreate):
+    return await _save(db, LeadMagnet(
+        title=lead_magnet.title,
+        type=lead_magnet.type,
+        value_promise=lead_magnet.value_promise,
+        conversion_score=lead_magnet.conversion_score,
+        content=lead_magnet.content,
+    ))
+# Create several lead magnets (e.g. accepted ideas) in one statement
+async def bulk_create_lead_magnets(db: AsyncSession, lead_magnets: List[schemas.LeadMagnetCreate]):
+    return await _bulk_create(db, LeadMagnet, [lead_magnet.model_dump() for lead_magnet in lead_magnets])
+# Get a lead magnet by ID
+async def get_lead_magnet(db: AsyncSession, lead_magnet_id: int):
+    return await db.get(LeadMagnet, lead_magnet_id)
+# Number of steps of a checklist content, NULL for content without a steps list
+def _content_steps():
+    steps = LeadMagnet.content["steps"]
+    return case((func.jsonb_typeof(steps) == "array", func.jsonb_array_length(steps)))
+#get all lead magnets newest first, optionally filtered on their JSONB content:
+#containment (@>) and key existence (?) are served by the GIN index on content
+async def get_lead_magnets(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    content_contains: Optional[dict] = None,
+    content_key: Optional[str] = None,
+    min_steps: Optional[int] = None,
+    max_steps: Optional[int] = None,
+):
+    query = select(LeadMagnet)
+    if content_contains:
+        query = query.where(LeadMagnet.content.contains(content_contains))
+    if content_key:
+        query = query.where(LeadMagnet.content.has_key(content_key))
+    if min_steps is not None:
+        query = query.where(_content_steps() >= min_steps)
+    if max_steps is not None:
+        query = query.where(_content_steps() <= max_steps)
+    result = await db.scalars(keyset_page(query, LeadMagnet, cursor, skip, limit, descending=True))
+    return result.all()
+# Funnel of lead magnets: children come from one selectin query per relationship
+# and the lead count from a correlated subquery, whatever the number of magnets
+def _funnel_query():
+    leads_count = (
+        select(func.count(Lead.id)).where(Lead.lead_magnet_id == LeadMagnet.id).scalar_subquery()
+    )
+    return select(LeadMagnet, leads_count).options(
+        selectinload(LeadMagnet.landing_pages),
+        selectinload(LeadMagnet.email_templates),
+        selectinload(LeadMagnet.upgrade_offers),
+    )
+async def _load_funnels(db: AsyncSession, query) -> List[LeadMagnet]:
+    lead_magnets = []
+    for lead_magnet, leads_count in (await db.execute(query)).all():
+        # read by schemas.LeadMagnetFunnel
+        lead_magnet.leads_count = leads_count
+        lead_magnets.append(lead_magnet)
+    return lead_magnets
+async def get_lead_magnet_funnel(db: AsyncSession, lead_magnet_id: int):
+    funnels = await _load_funnels(db, _funnel_query().where(LeadMagnet.id == lead_magnet_id))
+    return funnels[0] if funnels else None
+async def get_lead_magnet_funnels(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    return await _load_funnels(db, keyset_page(_funnel_query(), LeadMagnet, cursor, skip, limit, descending=True))
+# update json content of lead magnet
+async def update_lead_magnet_content(db: AsyncSession, lead_magnet_id: int, content: dict):
+    db_lead_magnet = await get_lead_magnet(db, lead_magnet_id)
+    if db_lead_magnet:
+        db_lead_magnet.content = content
+        await _save(db, db_lead_magnet)
+    return db_lead_magnet
+# Change parts of the content in place: one jsonb_set per (path, value), all in one
+# UPDATE, so the rest of the blob is neither sent nor rewritten by the app.
+# Like jsonb_set, only the last key of a path is created when missing.
+async def patch_lead_magnet_content(db: AsyncSession, lead_magnet_id: int, changes: List[schemas.LeadMagnetContentChange]):
+    content = func.coalesce(LeadMagnet.content, cast({}, JSONB))
+    for change in changes:
+        content = func.jsonb_set(content, cast(change.path, ARRAY(Text)), cast(change.value, JSONB), True)
+    db_lead_magnet = await db.scalar(
+        update(LeadMagnet)
+        .where(LeadMagnet.id == lead_magnet_id)
+        .values(content=content)
+        .returning(LeadMagnet)
+        .execution_options(populate_existing=True)
+    )
+    await db.commit()
+    return db_lead_magnet
+async def update_lead_magnet(db: AsyncSession, lead_magnet_id: int, updates: dict):
+    db_lead_magnet = await get_lead_magnet(db, lead_magnet_id)
+    if not db_lead_magnet:
+        return None
+    for key, value in updates.items():
+        if hasattr(db_lead_magnet, key):
+            setattr(db_lead_magnet, key, value)
+    return await _save(db, db_lead_magnet)
+
+# ==================== LEADS ====================
+
+# Capture leads in one statement: the emails are claimed in lead_emails with
+# INSERT ... ON CONFLICT (email) DO NOTHING RETURNING, the claimed ones are
+# inserted into leads and counted in the lead magnet stats, and welcome emails
+# are queued by a CTE of the same statement for the leads that asked for one
+# and whose lead magnet has content.
+# The lead_magnet_id foreign keys themselves reject unknown lead magnets.
+def _capture_leads_statement(leads: List[Tuple[schemas.LeadCreate, bool]]):
+    # the same email twice: the first one is captured
+    unique = {}
+    for lead, send_welcome in leads:
+        unique.setdefault(lead.email, (lead.name, lead.email, lead.lead_magnet_id, send_welcome))
+    rows = values(
+        column("name", String),
+        column("email", String),
+        column("lead_magnet_id", Integer),
+        column("send_welcome", Boolean),
+        name="rows",
+    ).data(list(unique.values()))
+    # a CTE binds the rows once, the statement reads them three times
+    source = select(rows).cte("captured")
+    claimed = (
+        pg_insert(LeadEmail)
+        .from_select(
+            ["email", "lead_id", "lead_magnet_id", "created_at"],
+            select(source.c.email, leads_id_seq.next_value(), source.c.lead_magnet_id, func.now()),
+        )
+        .on_conflict_do_nothing(index_elements=["email"])
+        .returning(LeadEmail.email, LeadEmail.lead_id, LeadEmail.created_at)
+        .cte("claimed")
+    )
+    new_leads = (
+        insert(Lead)
+        .from_select(
+            ["id", "name", "email", "lead_magnet_id", "created_at"],
+            select(claimed.c.lead_id, source.c.name, source.c.email, source.c.lead_magnet_id, claimed.c.created_at)
+            .join(claimed, claimed.c.email == source.c.email),
+        )
+        .returning(*Lead.__table__.columns)
+        .cte("new_leads")
+    )
+    welcome = (
+        select(
+            func.concat("welcome:", new_leads.c.id, ":", new_leads.c.lead_magnet_id),
+            literal("welcome"),
+            new_leads.c.id,
+            new_leads.c.lead_magnet_id,
+            new_leads.c.email,
+            new_leads.c.name,
+            literal(OutboxStatusEnum.pending, EmailOutbox.status.type),
+            literal(0),
+        )
+        .join(source, source.c.email == new_leads.c.email)
+        .join(LeadMagnet, LeadMagnet.id == new_leads.c.lead_magnet_id)
+        # an empty content column holds JSON null
+        .where(source.c.send_welcome, cast(LeadMagnet.content, Text).not_in(["null", "{}", "[]"]))
+    )
+    enqueue = (
+        pg_insert(EmailOutbox)
+        .from_select(
+            ["idempotency_key", "kind", "lead_id", "lead_magnet_id", "to_email", "to_name", "status", "attempts"],
+            welcome,
+        )
+        .on_conflict_do_nothing(index_elements=["idempotency_key"])
+        .cte("enqueue_welcome")
+    )
+    bucket = stats_bucket(new_leads.c.created_at)
+    count = (
+        insert(LeadMagnetStatsDelta)
+        .from_select(
+            ["lead_magnet_id", "bucket", "leads"],
+            select(new_leads.c.lead_magnet_id, bucket, func.count()).group_by(new_leads.c.lead_magnet_id, bucket),
+        )
+        .cte("count_leads")
+    )
+    return select(Lead).from_statement(select(new_leads).add_cte(enqueue, count))
+class LeadMagnetNotFound(Exception):
+    pass
+# Create leads from (lead, send_welcome) pairs in one transaction; returns the
+# created leads by email, emails already registered are left out
+async def create_leads(db: AsyncSession, leads: List[Tuple[schemas.LeadCreate, bool]]) -> Dict[str, Lead]:
+    if not leads:
+        return {}
+    try:
+        created = (await db.scalars(_capture_leads_statement(leads))).all()
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if getattr(e.orig, "pgcode", None) == FOREIGN_KEY_VIOLATION:
+            raise LeadMagnetNotFound() from e
+        raise
+    return {lead.email: lead for lead in created}
+# Create a new lead; None when the email is already registered
+async def create_lead(db: AsyncSession, lead: schemas.LeadCreate, enqueue_welcome: bool = False):
+    created = await create_leads(db, [(lead, enqueue_welcome)])
+    return created.get(lead.email)
+def _created_between(query, created_from: Optional[datetime], created_to: Optional[datetime]):
+    """created_from <= created_at < created_to, also limits the scan to the matching partitions"""
+    if created_from is not None:
+        query = query.where(Lead.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Lead.created_at < created_to)
+    return query
+# Get a lead by ID
+async def get_lead(db: AsyncSession, lead_id: int):
+    return await db.scalar(select(Lead).where(Lead.id == lead_id))
+# Get a lead by email, its registry entry gives the partition to read
+async def get_lead_by_email(db: AsyncSession, email: str):
+    return await db.scalar(
+        select(Lead)
+        .join(LeadEmail, (LeadEmail.lead_id == Lead.id) & (LeadEmail.created_at == Lead.created_at))
+        .where(LeadEmail.email == email)
+    )
+#get all leads
+async def get_leads(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    query = _created_between(select(Lead), created_from, created_to)
+    result = await db.scalars(keyset_page(query, Lead, cursor, skip, limit))
+    return result.all()
+#get leads by lead magnet id
+async def get_leads_by_lead_magnet(
+    db: AsyncSession,
+    lead_magnet_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    query = _created_between(select(Lead).where(Lead.lead_magnet_id == lead_magnet_id), created_from, created_to)
+    result = await db.scalars(keyset_page(query, Lead, cursor, skip, limit))
+    return result.all()
+# Stream leads (all, or of one lead magnet) in id order from a server-side
+# cursor, chunk_size rows at a time
+async def stream_leads(
+    db: AsyncSession,
+    lead_magnet_id: Optional[int] = None,
+    chunk_size: int = 1000,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> AsyncIterator[List]:
+    query = select(Lead.id, Lead.name, Lead.email, Lead.lead_magnet_id, Lead.created_at).order_by(Lead.id)
+    query = _created_between(query, created_from, created_to)
+    if lead_magnet_id is not None:
+        query = query.where(Lead.lead_magnet_id == lead_magnet_id)
+    result = await db.stream(query.execution_options(yield_per=chunk_size))
+    async for rows in result.partitions():
+        yield rows
+# Count leads of a lead magnet
+async def count_leads_by_lead_magnet(db: AsyncSession, lead_magnet_id: int) -> int:
+    return await db.scalar(select(func.count(Lead.id)).where(Lead.lead_magnet_id == lead_magnet_id))
+async def update_lead(db: AsyncSession, lead_id: int, lead_update: schemas.LeadCreate):
+    db_lead = await get_lead(db, lead_id)
+    if not db_lead:
+        return None
+    # keep the email registry in step
+    await db.execute(
+        update(LeadEmail)
+        .where(LeadEmail.email == db_lead.email)
+        .values(email=lead_update.email, lead_magnet_id=lead_update.lead_magnet_id)
+    )
+    if db_lead.lead_magnet_id != lead_update.lead_magnet_id:
+        await db.execute(stats_delta_insert(db_lead.lead_magnet_id, db_lead.created_at, leads=-1))
+        await db.execute(stats_delta_insert(lead_update.lead_magnet_id, db_lead.created_at, leads=1))
+    db_lead.name = lead_update.name
+    db_lead.email = lead_update.email
+    db_lead.lead_magnet_id = lead_update.lead_magnet_id
+    return await _save(db, db_lead)
+async def delete_lead(db: AsyncSession, lead_id: int) -> bool:
+    db_lead = await get_lead(db, lead_id)
+    if db_lead:
+        await db.execute(delete(LeadEmail).where(LeadEmail.email == db_lead.email))
+        await db.execute(stats_delta_insert(db_lead.lead_magnet_id, db_lead.created_at, leads=-1))
+    return await _delete(db, db_lead)
+
+# ==================== LANDING PAGES ====================
+
+# Create a new landing page
+async def create_landing_page(db: AsyncSession, landing_page: schemas.LandingPageCreate):
+    return await _save(db, LandingPage(**_landing_page_values(landing_page)))
+async def get_landing_page(db: AsyncSession, landing_page_id: int):
+    return await db.get(LandingPage, landing_page_id)
+async def get_landing_pages(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    result = await db.scalars(keyset_page(select(LandingPage), LandingPage, cursor, skip, limit))
+    return result.all()
+#get landing pages by lead magnet id
+async def get_landing_pages_by_lead_magnet(db: AsyncSession, lead_magnet_id: int):
+    result = await db.scalars(select(LandingPage).where(LandingPage.lead_magnet_id == lead_magnet_id))
+    return result.all()
+# the landing page of a lead magnet (the first one if several were created)
+async def get_landing_page_by_lead_magnet(db: AsyncSession, lead_magnet_id: int):
+    return await db.scalar(
+        select(LandingPage).where(LandingPage.lead_magnet_id == lead_magnet_id).order_by(LandingPage.id).limit(1)
+    )
+async def update_landing_page(db: AsyncSession, landing_page_id: int, landing_page_update: schemas.LandingPageCreate):
+    db_landing_page = await get_landing_page(db, landing_page_id)
+    if not db_landing_page:
+        return None
+    for key, value in _landing_page_values(landing_page_update).items():
+        setattr(db_landing_page, key, value)
+    return await _save(db, db_landing_page)
+async def delete_landing_page(db: AsyncSession, landing_page_id: int) -> bool:
+    return await _delete(db, await get_landing_page(db, landing_page_id))
+
+# ==================== EMAIL TEMPLATES ====================
+
+# Create a new email template
+async def create_email_template(db: AsyncSession, email_template: schemas.EmailTemplateCreate):
+    return await _save(db, EmailTemplate(
+        lead_magnet_id=email_template.lead_magnet_id,
+        sequence_number=email_template.sequence_number,
+        subject=email_template.subject,
+        body=email_template.body,
+    ))
+# Create a whole email sequence in one statement
+async def bulk_create_email_templates(db: AsyncSession, email_templates: List[schemas.EmailTemplateCreate]):
+    return await _bulk_create(db, EmailTemplate, [email_template.model_dump() for email_template in email_templates])
+# Get an email template by ID
+async def get_email_template(db: AsyncSession, email_template_id: int):
+    return await db.get(EmailTemplate, email_template_id)
+async def get_email_templates(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    result = await db.scalars(keyset_page(select(EmailTemplate), EmailTemplate, cursor, skip, limit))
+    return result.all()
+#get email templates by lead magnet id ordered by sequence number
+async def get_email_templates_by_lead_magnet(db: AsyncSession, lead_magnet_id: int):
+    result = await db.scalars(
+        select(EmailTemplate).where(EmailTemplate.lead_magnet_id == lead_magnet_id).order_by(EmailTemplate.sequence_number, EmailTemplate.id)
+    )
+    return result.all()
+async def update_email_template(db: AsyncSession, email_template_id: int, email_template_update: schemas.EmailTemplateCreate):
+    db_email_template = await get_email_template(db, email_template_id)
+    if not db_email_template:
+        return None
+    db_email_template.lead_magnet_id = email_template_update.lead_magnet_id
+    db_email_template.sequence_number = email_template_update.sequence_number
+    db_email_template.subject = email_template_update.subject
+    db_email_template.body = email_template_update.body
+    return await _save(db, db_email_template)
+async def delete_email_template(db: AsyncSession, email_template_id: int) -> bool:
+    return await _delete(db, await get_email_template(db, email_template_id))
+
+# ==================== UPGRADE OFFERS ====================
+
+# Create a new upgrade offer
+async def create_upgrade_offer(db: AsyncSession, upgrade_offer: schemas.UpgradeOfferCreate):
+    return await _save(db, UpgradeOffer(
+        lead_magnet_id=upgrade_offer.lead_magnet_id,
+        title=upgrade_offer.title,
+        description=upgrade_offer.description,
+        link=upgrade_offer.link,
+    ))
+# Create several upgrade offers in one statement
+async def bulk_create_upgrade_offers(db: AsyncSession, upgrade_offers: List[schemas.UpgradeOfferCreate]):
+    return await _bulk_create(db, UpgradeOffer, [upgrade_offer.model_dump() for upgrade_offer in upgrade_offers])
+#get upgrade offers by lead magnet id
+async def get_upgrade_offers_by_lead_magnet(db: AsyncSession, lead_magnet_id: int):
+    result = await db.scalars(select(UpgradeOffer).where(UpgradeOffer.lead_magnet_id == lead_magnet_id))
+    return result.all()
+
+# ==================== EMAIL OUTBOX / DRIP SEQUENCES ====================
+
+# Delivery status counts for an email template
+async def get_outbox_status_counts(db: AsyncSession, email_template_id: int) -> Dict[str, int]:
+    result = await db.execute(
+        select(EmailOutbox.status, func.count(EmailOutbox.id))
+        .where(EmailOutbox.email_template_id == email_template_id)
+        .group_by(EmailOutbox.status)
+    )
+    return {status.value: count for status, count in result.all()}
+# Start (or restart) the nurture sequence of a lead
+async def start_lead_sequence(db: AsyncSession, lead: Lead, first_sequence_number: int) -> LeadSequence:
+    await db.execute(lead_sequence_upsert(lead, first_sequence_number))
+    await db.commit()
+    return await get_lead_sequence(db, lead.id)
+async def get_lead_sequence(db: AsyncSession, lead_id: int):
+    # populate_existing: the upsert above bypassed the identity map
+    return await db.scalar(
+        select(LeadSequence).where(LeadSequence.lead_id == lead_id).execution_options(populate_existing=True)
+    )
+
+# ==================== LEAD MAGNET STATS ====================
+
+STATS_GRANULARITIES = ("hour", "day", "week", "month")
+# Lead, sent email and view counts of a lead magnet per bucket of granularity (UTC),
+# for the hours in [start, end): the hourly rollup plus the deltas not
+# compacted yet, so the cost follows the number of buckets, not of leads
+async def get_lead_magnet_stats(
+    db: AsyncSession,
+    lead_magnet_id: int,
+    granularity: str = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    if granularity not in STATS_GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity}")
+    def counts(model):
+        query = select(model.bucket, model.leads, model.emails_sent, model.views).where(model.lead_magnet_id == lead_magnet_id)
+        if start is not None:
+            query = query.where(model.bucket >= start)
+        if end is not None:
+            query = query.where(model.bucket < end)
+        return query
+    combined = union_all(counts(LeadMagnetStats), counts(LeadMagnetStatsDelta)).subquery()
+    bucket = func.date_trunc(text(f"'{granularity}'"), combined.c.bucket, text("'UTC'"))
+    result = await db.execute(
+        select(
+            bucket.label("bucket"),
+            func.sum(combined.c.leads).label("leads"),
+            func.sum(combined.c.emails_sent).label("emails_sent"),
+            func.sum(combined.c.views).label("views"),
+        )
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    return result.all()
+# Hourly view and lead counts of every lead magnet from start on, rollup and
+# pending deltas combined; loads the ranking window
+async def get_stats_window(db: AsyncSession, start: datetime):
+    def counts(model):
+        return select(model.lead_magnet_id, model.bucket, model.views, model.leads).where(model.bucket >= start)
+    combined = union_all(counts(LeadMagnetStats), counts(LeadMagnetStatsDelta)).subquery()
+    result = await db.execute(
+        select(
+            combined.c.lead_magnet_id,
+            combined.c.bucket,
+            func.sum(combined.c.views).label("views"),
+            func.sum(combined.c.leads).label("leads"),
+        )
+        .group_by(combined.c.lead_magnet_id, combined.c.bucket)
+    )
+    return result.all()
+# Add landing page views as stats deltas, rows are (lead_magnet_id, hour, views)
+async def add_stats_views(db: AsyncSession, rows: List[Tuple[int, datetime, int]]):
+    if not rows:
+        return
+    await db.execute(
+        insert(LeadMagnetStatsDelta),
+        [{"lead_magnet_id": lead_magnet_id, "bucket": bucket, "views": views} for lead_magnet_id, bucket, views in rows],
+    )
+    await db.commit()
+async def get_lead_magnets_by_ids(db: AsyncSession, lead_magnet_ids: List[int]) -> Dict[int, LeadMagnet]:
+    result = await db.scalars(select(LeadMagnet).where(LeadMagnet.id.in_(lead_magnet_ids)))
+    return {lead_magnet.id: lead_magnet for lead_magnet in result}
@@ -2,11 +2,93 @@ import os
 from dotenv import load_dotenv  
 load_dotenv()
 
+def _parse_rate_limits(value: str) -> dict:
+    """Parse "key:rate,key:rate" into {key: rate}"""
+    return {
+        key.strip().lower(): float(rate)
+        for key, rate in (item.rsplit(":", 1) for item in value.split(",") if item.strip())
+    }
+
 HF_API_KEY = os.getenv("HF_API_KEY")
+# GET requests from a client that wrote within this many seconds read from the
+# primary instead of a replica (see DATABASE_REPLICA_URLS)
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+# Database connection pools (one for the API, one for the background worker)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# seconds to wait for a free connection before "QueuePool limit" errors
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# replace connections older than this many seconds, -1 keeps them forever
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# test connections on checkout so a Postgres restart doesn't surface stale ones
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
 
-SMTP_SERVER =""
-# os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = ""
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+# set to false for servers without STARTTLS (e.g. the local benchmark sink)
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() in ("1", "true", "yes")
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 FROM_EMAIL = os.getenv("FROM_EMAIL")
+# SMTP connection pool
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+# encoded lead magnet attachments kept in memory per EmailService
+EMAIL_ATTACHMENT_CACHE_SIZE = int(os.getenv("EMAIL_ATTACHMENT_CACHE_SIZE", "32"))
+# Bulk sending: concurrent SMTP sends and per provider rate limits (messages/second),
+# e.g. SMTP_RATE_LIMITS="smtp.gmail.com:5,smtp.sendgrid.net:100"
+SMTP_BULK_CONCURRENCY = int(os.getenv("SMTP_BULK_CONCURRENCY", str(SMTP_POOL_SIZE)))
+SMTP_DEFAULT_RATE_LIMIT = float(os.getenv("SMTP_DEFAULT_RATE_LIMIT", "10"))
+SMTP_RATE_LIMITS = _parse_rate_limits(os.getenv("SMTP_RATE_LIMITS", ""))
+# per recipient domain throttling (recipients/second), e.g. "gmail.com:20,yahoo.com:10"
+SMTP_DEFAULT_DOMAIN_RATE_LIMIT = float(os.getenv("SMTP_DEFAULT_DOMAIN_RATE_LIMIT", "20"))
+SMTP_DOMAIN_RATE_LIMITS = _parse_rate_limits(os.getenv("SMTP_DOMAIN_RATE_LIMITS", ""))
+# identical messages to one domain are sent as one transaction with up to this many RCPT TO
+SMTP_MAX_RECIPIENTS_PER_MESSAGE = int(os.getenv("SMTP_MAX_RECIPIENTS_PER_MESSAGE", "50"))
+# Group commit for POST /leads: captured leads are buffered and written by one
+# multi-row insert per batch (up to LEAD_INGEST_MAX_BATCH rows, or whatever
+# arrived within LEAD_INGEST_MAX_DELAY_MS); each request returns once its batch committed.
+# A row takes 4 bind parameters and asyncpg allows 32767 per statement, keep it under 8000
+LEAD_INGEST_BUFFER = os.getenv("LEAD_INGEST_BUFFER", "false").lower() in ("1", "true", "yes")
+LEAD_INGEST_MAX_BATCH = int(os.getenv("LEAD_INGEST_MAX_BATCH", "500"))
+LEAD_INGEST_MAX_DELAY_MS = float(os.getenv("LEAD_INGEST_MAX_DELAY_MS", "5"))
+# batches written at the same time, each holds a database connection
+LEAD_INGEST_CONCURRENCY = int(os.getenv("LEAD_INGEST_CONCURRENCY", "2"))
+# rows fetched per server-side cursor round trip by GET /leads/export
+LEAD_EXPORT_CHUNK_SIZE = int(os.getenv("LEAD_EXPORT_CHUNK_SIZE", "5000"))
+# Email outbox dispatcher
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "30"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+# leads streamed per chunk when a template is queued for all leads of a lead magnet
+BULK_SEND_CHUNK_SIZE = int(os.getenv("BULK_SEND_CHUNK_SIZE", "1000"))
+# Drip scheduler for nurture sequences
+DRIP_DELAY_HOURS = float(os.getenv("DRIP_DELAY_HOURS", "24"))
+DRIP_SWEEP_INTERVAL = float(os.getenv("DRIP_SWEEP_INTERVAL", "30"))
+DRIP_BATCH_SIZE = int(os.getenv("DRIP_BATCH_SIZE", "1000"))
+# Lead magnet stats: deltas folded into the hourly rollup every
+# STATS_COMPACTION_INTERVAL seconds, up to STATS_COMPACTION_BATCH_SIZE per statement
+STATS_COMPACTION_INTERVAL = float(os.getenv("STATS_COMPACTION_INTERVAL", "30"))
+STATS_COMPACTION_BATCH_SIZE = int(os.getenv("STATS_COMPACTION_BATCH_SIZE", "10000"))
+# Monthly partitions of leads: created this many months ahead, checked every
+# LEAD_PARTITION_INTERVAL seconds by the maintenance job
+LEAD_PARTITION_MONTHS_AHEAD = int(os.getenv("LEAD_PARTITION_MONTHS_AHEAD", "3"))
+LEAD_PARTITION_INTERVAL = float(os.getenv("LEAD_PARTITION_INTERVAL", "3600"))
+# partitions older than this many months are archived, 0 keeps them all;
+# "table" moves them to the LEAD_ARCHIVE_SCHEMA schema, "parquet" writes them
+# to LEAD_ARCHIVE_DIR (needs pyarrow) and drops them
+LEAD_ARCHIVE_AFTER_MONTHS = int(os.getenv("LEAD_ARCHIVE_AFTER_MONTHS", "0"))
+LEAD_ARCHIVE_MODE = os.getenv("LEAD_ARCHIVE_MODE", "table").lower()
+LEAD_ARCHIVE_SCHEMA = os.getenv("LEAD_ARCHIVE_SCHEMA", "lead_archive")
+LEAD_ARCHIVE_DIR = os.getenv("LEAD_ARCHIVE_DIR", "lead_archive")
+# Live lead magnet ranking by conversion rate (leads per landing page view) over
+# the last RANKING_WINDOW_HOURS hours; lead magnets with fewer views aren't ranked.
+# Views are written every RANKING_PERSIST_INTERVAL seconds and the window is
+# reloaded from the stats rollup every RANKING_REFRESH_INTERVAL seconds
+RANKING_WINDOW_HOURS = int(os.getenv("RANKING_WINDOW_HOURS", "24"))
+RANKING_MIN_VIEWS = int(os.getenv("RANKING_MIN_VIEWS", "20"))
+RANKING_PERSIST_INTERVAL = float(os.getenv("RANKING_PERSIST_INTERVAL", "10"))
+RANKING_REFRESH_INTERVAL = float(os.getenv("RANKING_REFRESH_INTERVAL", "60"))
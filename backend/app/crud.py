@@ -1,5 +1,17 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Iterable, Iterator
+from sqlalchemy import func, or_, and_, update, delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from models import LeadMagnet, Lead, LandingPage, EmailTemplate, UpgradeOffer
+from models import (
+    LeadMagnet, Lead, LandingPage, EmailTemplate, UpgradeOffer,
+    EmailOutbox, OutboxStatusEnum, LeadSequence, SequenceStatusEnum, LeadEmail,
+    LeadMagnetStats, LeadMagnetStatsDelta,
+)
+from statements import (
+    outbox_insert, welcome_outbox_row, nurture_outbox_row, lead_sequence_upsert,
+    stats_bucket, stats_delta_insert,
+)
 import schemas
 
 
@@ -44,17 +56,64 @@ def update_lead_magnet(db: Session, lead_magnet_id: int, updates: dict):
     db.commit()
     db.refresh(db_lead_magnet)
     return db_lead_magnet
-# Create a new lead
-def create_lead(db: Session, lead: schemas.LeadCreate):
+# Create a new lead, optionally queueing its welcome email in the same transaction
+def create_lead(db: Session, lead: schemas.LeadCreate, enqueue_welcome: bool = False):
     db_lead = Lead(
         name=lead.name,
         email=lead.email,
         lead_magnet_id=lead.lead_magnet_id,
     )
     db.add(db_lead)
+    db.flush()
+    db.add(LeadEmail(
+        email=db_lead.email,
+        lead_id=db_lead.id,
+        lead_magnet_id=db_lead.lead_magnet_id,
+        created_at=db_lead.created_at,
+    ))
+    db.execute(stats_delta_insert(db_lead.lead_magnet_id, db_lead.created_at, leads=1))
+    if enqueue_welcome:
+        enqueue_welcome_email(db, db_lead)
     db.commit()
     db.refresh(db_lead)
     return db_lead
+# Get a lead by ID
+def get_lead(db: Session, lead_id: int):
+    return db.query(Lead).filter(Lead.id == lead_id).first()
+# Get a lead by email
+def get_lead_by_email(db: Session, email: str):
+    return (
+        db.query(Lead)
+        .join(LeadEmail, and_(LeadEmail.lead_id == Lead.id, LeadEmail.created_at == Lead.created_at))
+        .filter(LeadEmail.email == email)
+        .first()
+    )
+#get leads by lead magnet id
+def get_leads_by_lead_magnet(db: Session, lead_magnet_id: int, skip: int = 0, limit: Optional[int] = None):
+    query = db.query(Lead).filter(Lead.lead_magnet_id == lead_magnet_id).order_by(Lead.id).offset(skip)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+# Count leads of a lead magnet
+def count_leads_by_lead_magnet(db: Session, lead_magnet_id: int) -> int:
+    return db.query(func.count(Lead.id)).filter(Lead.lead_magnet_id == lead_magnet_id).scalar()
+# Stream (id, name, email) of a lead magnet's leads in keyset paginated chunks,
+# each chunk is a fresh "id > last id" query so memory stays flat and the
+# caller may commit between chunks
+def iter_leads_by_lead_magnet(db: Session, lead_magnet_id: int, chunk_size: int = 1000) -> Iterator[List]:
+    last_id = 0
+    while True:
+        chunk = (
+            db.query(Lead.id, Lead.name, Lead.email)
+            .filter(Lead.lead_magnet_id == lead_magnet_id, Lead.id > last_id)
+            .order_by(Lead.id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
 # Create a new landing page
 def create_landing_page(db: Session, landing_page: schemas.LandingPageCreate):
     db_landing_page = LandingPage(
@@ -84,9 +143,12 @@ def create_email_template(db: Session, email_template: schemas.EmailTemplateCrea
     db.commit()
     db.refresh(db_email_template)
     return db_email_template
+# Get an email template by ID
+def get_email_template(db: Session, email_template_id: int):
+    return db.query(EmailTemplate).filter(EmailTemplate.id == email_template_id).first()
 #get email templates by lead magnet id ordered by sequence number
 def get_email_templates_by_lead_magnet(db: Session, lead_magnet_id: int):
-    return db.query(EmailTemplate).filter(EmailTemplate.lead_magnet_id == lead_magnet_id).order_by(EmailTemplate.sequence_number).all()
+    return db.query(EmailTemplate).filter(EmailTemplate.lead_magnet_id == lead_magnet_id).order_by(EmailTemplate.sequence_number, EmailTemplate.id).all()
 # Create a new upgrade offer
 def create_upgrade_offer(db: Session, upgrade_offer: schemas.UpgradeOfferCreate):
     db_upgrade_offer = UpgradeOffer(
@@ -101,4 +163,149 @@ def create_upgrade_offer(db: Session, upgrade_offer: schemas.UpgradeOfferCreate)
     return db_upgrade_offer 
 #get upgrade offers by lead magnet id
 def get_upgrade_offers_by_lead_magnet(db: Session, lead_magnet_id: int):
-    return db.query(UpgradeOffer).filter(UpgradeOffer.lead_magnet_id == lead_magnet_id).all()   
\ No newline at end of file
+    return db.query(UpgradeOffer).filter(UpgradeOffer.lead_magnet_id == lead_magnet_id).all()
+
+# ==================== EMAIL OUTBOX ====================
+# Enqueue functions only add rows to the current transaction, the caller commits.
+
+def enqueue_outbox_rows(db: Session, rows: List[Dict]) -> int:
+    if not rows:
+        return 0
+    return db.execute(outbox_insert(rows)).rowcount
+def enqueue_welcome_email(db: Session, lead: Lead) -> int:
+    return enqueue_outbox_rows(db, [welcome_outbox_row(lead)])
+def enqueue_nurture_emails(db: Session, email_template: EmailTemplate, leads: Iterable[Lead]) -> int:
+    return enqueue_outbox_rows(db, [nurture_outbox_row(email_template, lead) for lead in leads])
+# Claim due outbox rows for this dispatcher; SKIP LOCKED lets several dispatchers run side by side
+def claim_outbox_batch(db: Session, limit: int, lease_seconds: int) -> List[EmailOutbox]:
+    now = datetime.now(timezone.utc)
+    rows = (
+        db.query(EmailOutbox)
+        .filter(or_(
+            and_(EmailOutbox.status == OutboxStatusEnum.pending, EmailOutbox.next_attempt_at <= now),
+            # a dispatcher died while sending, its lease expired
+            and_(EmailOutbox.status == OutboxStatusEnum.sending, EmailOutbox.locked_until < now),
+        ))
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for row in rows:
+        row.status = OutboxStatusEnum.sending
+        row.attempts += 1
+        row.locked_until = now + timedelta(seconds=lease_seconds)
+    db.commit()
+    return rows
+# Mark outbox rows sent and count them in the lead magnet stats, in one statement
+def mark_outbox_sent(db: Session, outbox_ids: List[int]):
+    if not outbox_ids:
+        return
+    sent = (
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(outbox_ids), EmailOutbox.status != OutboxStatusEnum.sent)
+        .values(status=OutboxStatusEnum.sent, sent_at=func.now(), locked_until=None, last_error=None)
+        .returning(EmailOutbox.lead_magnet_id, EmailOutbox.sent_at)
+        .cte("sent")
+    )
+    bucket = stats_bucket(sent.c.sent_at)
+    db.execute(
+        insert(LeadMagnetStatsDelta)
+        .from_select(
+            ["lead_magnet_id", "bucket", "emails_sent"],
+            select(sent.c.lead_magnet_id, bucket, func.count()).group_by(sent.c.lead_magnet_id, bucket),
+        )
+        .add_cte(sent)
+    )
+    db.commit()
+# Failed attempt: retry at retry_at, or give up when retry_at is None
+def mark_outbox_failed(db: Session, outbox_id: int, error: str, retry_at: Optional[datetime]):
+    values = {"last_error": error, "locked_until": None}
+    if retry_at is None:
+        values["status"] = OutboxStatusEnum.failed
+    else:
+        values["status"] = OutboxStatusEnum.pending
+        values["next_attempt_at"] = retry_at
+    db.execute(update(EmailOutbox).where(EmailOutbox.id == outbox_id).values(**values))
+    db.commit()
+# Delivery status counts for an email template
+def get_outbox_status_counts(db: Session, email_template_id: int) -> Dict[str, int]:
+    rows = (
+        db.query(EmailOutbox.status, func.count(EmailOutbox.id))
+        .filter(EmailOutbox.email_template_id == email_template_id)
+        .group_by(EmailOutbox.status)
+        .all()
+    )
+    return {status.value: count for status, count in rows}
+
+# ==================== DRIP SEQUENCES ====================
+
+def start_lead_sequence(db: Session, lead: Lead, first_sequence_number: int) -> LeadSequence:
+    db.execute(lead_sequence_upsert(lead, first_sequence_number))
+    db.commit()
+    return get_lead_sequence(db, lead.id)
+def get_lead_sequence(db: Session, lead_id: int):
+    return db.query(LeadSequence).filter(LeadSequence.lead_id == lead_id).first()
+# Lock a batch of due sequences for one sweep; the caller commits
+def claim_due_sequences(db: Session, limit: int) -> List[LeadSequence]:
+    return (
+        db.query(LeadSequence)
+        .filter(
+            LeadSequence.status == SequenceStatusEnum.active,
+            LeadSequence.next_send_at <= func.now(),
+        )
+        .order_by(LeadSequence.next_send_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+# ==================== LEAD MAGNET STATS ====================
+# Changes are counted by inserting deltas in the transaction that makes them,
+# the compaction job folds them into the hourly lead_magnet_stats rollup
+# (the delta statements are in statements.py).
+
+# Move up to limit deltas into the rollup in one statement; SKIP LOCKED lets
+# several compactors run side by side. Returns how many deltas were folded.
+def compact_stats_deltas(db: Session, limit: int) -> int:
+    moved = (
+        delete(LeadMagnetStatsDelta)
+        .where(LeadMagnetStatsDelta.id.in_(
+            select(LeadMagnetStatsDelta.id)
+            .order_by(LeadMagnetStatsDelta.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ))
+        .returning(
+            LeadMagnetStatsDelta.lead_magnet_id,
+            LeadMagnetStatsDelta.bucket,
+            LeadMagnetStatsDelta.leads,
+            LeadMagnetStatsDelta.emails_sent,
+            LeadMagnetStatsDelta.views,
+        )
+        .cte("moved")
+    )
+    totals = (
+        select(
+            moved.c.lead_magnet_id,
+            moved.c.bucket,
+            func.sum(moved.c.leads),
+            func.sum(moved.c.emails_sent),
+            func.sum(moved.c.views),
+        )
+        # deltas of deleted lead magnets are dropped
+        .join(LeadMagnet, LeadMagnet.id == moved.c.lead_magnet_id)
+        .group_by(moved.c.lead_magnet_id, moved.c.bucket)
+    )
+    upsert = pg_insert(LeadMagnetStats).from_select(["lead_magnet_id", "bucket", "leads", "emails_sent", "views"], totals)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["lead_magnet_id", "bucket"],
+        set_={
+            "leads": LeadMagnetStats.leads + upsert.excluded.leads,
+            "emails_sent": LeadMagnetStats.emails_sent + upsert.excluded.emails_sent,
+            "views": LeadMagnetStats.views + upsert.excluded.views,
+        },
+    ).cte("folded")
+    folded = db.execute(select(func.count()).select_from(moved).add_cte(upsert)).scalar()
+    db.commit()
+    return folded
@@ -1,19 +1,187 @@
-from sqlalchemy import create_engine
+import itertools
+import threading
+import time
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
 load_dotenv()
 import os
+from config import DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, READ_YOUR_WRITES_SECONDS
 # the db url  b in the .env file
 DATABASE_URL = os.getenv("DATABASE_URL")
-# create the database engine
-engine = create_engine(DATABASE_URL)
+# optional read replicas of it, comma separated
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+def async_database_url(url: str) -> str:
+    """Same database through the asyncpg driver"""
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+class PoolMetrics:
+    """Checkout counters of one connection pool, read through /metrics/db-pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connections_opened = 0
+        self.invalidations = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_checked_out = 0
+        self.peak_overflow = 0
+
+    def record_checkout(self, pool, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.peak_checked_out = max(self.peak_checked_out, pool.checkedout())
+            self.peak_overflow = max(self.peak_overflow, pool.overflow())
+
+    def record_timeout(self, wait: float):
+        with self._lock:
+            self.timeouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def record_connection_opened(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def to_dict(self) -> dict:
+        pool = self.pool
+        with self._lock:
+            waits = self.checkouts + self.timeouts
+            return {
+                "pool_size": pool.size(),
+                "max_overflow": DB_MAX_OVERFLOW,
+                "checked_out": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "peak_checked_out": self.peak_checked_out,
+                "peak_overflow": max(self.peak_overflow, 0),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connections_opened": self.connections_opened,
+                "invalidations": self.invalidations,
+                "avg_wait_ms": round(self.total_wait / waits * 1000, 3) if waits else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
+
+class _InstrumentedPool:
+    """Times every checkout (queue wait, new connection and pre-ping included)"""
+    metrics: PoolMetrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # dispose() swaps in a fresh pool of the same class
+        self.metrics.pool = self
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - start)
+            raise
+        self.metrics.record_checkout(self, time.perf_counter() - start)
+        return connection
+
+    def _create_connection(self):
+        self.metrics.record_connection_opened()
+        return super()._create_connection()
+
+def _instrumented(pool_class, metrics: PoolMetrics):
+    return type(f"Instrumented{pool_class.__name__}", (_InstrumentedPool, pool_class), {"metrics": metrics})
+
+def _pool_options(pool_class, metrics: PoolMetrics) -> dict:
+    return {
+        "poolclass": _instrumented(pool_class, metrics),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+def _count_invalidations(engine, metrics: PoolMetrics):
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.record_invalidation()
+
+worker_pool_metrics = PoolMetrics("worker")
+api_pool_metrics = PoolMetrics("api")
+
+# create the database engine, used by the background worker services
+engine = create_engine(DATABASE_URL, **_pool_options(QueuePool, worker_pool_metrics))
+_count_invalidations(engine, worker_pool_metrics)
 # create a configured "Session" class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-# create a base class for our models
-def get_db():
-    db = SessionLocal()
-    try:
+# async engine for the routers, queries no longer block the event loop
+async_engine = create_async_engine(async_database_url(DATABASE_URL), **_pool_options(AsyncAdaptedQueuePool, api_pool_metrics))
+_count_invalidations(async_engine.sync_engine, api_pool_metrics)
+# objects stay usable after commit, the routers return them right away
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# read replicas for GET requests, used round robin; without any the primary serves reads
+replica_pool_metrics = [PoolMetrics(f"replica-{i}") for i in range(len(DATABASE_REPLICA_URLS))]
+replica_engines = []
+for url, metrics in zip(DATABASE_REPLICA_URLS, replica_pool_metrics):
+    replica_engine = create_async_engine(async_database_url(url), **_pool_options(AsyncAdaptedQueuePool, metrics))
+    _count_invalidations(replica_engine.sync_engine, metrics)
+    replica_engines.append(replica_engine)
+_replica_sessions = itertools.cycle(
+    [async_sessionmaker(replica_engine, autoflush=False, expire_on_commit=False) for replica_engine in replica_engines]
+    or [AsyncSessionLocal]
+)
+
+def get_pool_metrics() -> dict:
+    return {
+        metrics.name: metrics.to_dict()
+        for metrics in (api_pool_metrics, worker_pool_metrics, *replica_pool_metrics)
+    }
+
+async def dispose_async_engines():
+    for async_db_engine in (async_engine, *replica_engines):
+        await async_db_engine.dispose()
+
+# Read-your-writes: writes pin their client to the primary with a short lived
+# cookie, so what it just wrote isn't read back from a lagging replica
+PRIMARY_PIN_COOKIE = "db_primary_pin"
+READ_METHODS = ("GET", "HEAD")
+
+def session_factory_for(request: Request):
+    """Replica sessions for reads of unpinned clients, primary sessions otherwise"""
+    if request.method in READ_METHODS and PRIMARY_PIN_COOKIE not in request.cookies:
+        return next(_replica_sessions)
+    return AsyncSessionLocal
+
+def pin_to_primary(response: Response):
+    """Route dependency of writes that don't go through get_db"""
+    response.set_cookie(PRIMARY_PIN_COOKIE, "1", max_age=READ_YOUR_WRITES_SECONDS, httponly=True, samesite="lax")
+
+async def get_db(request: Request, response: Response):
+    """Session of a route; non GET routes are writes, they use the primary and pin their client to it"""
+    if request.method not in READ_METHODS:
+        pin_to_primary(response)
+    async with session_factory_for(request)() as db:
+        yield db
+
+async def get_read_db(request: Request):
+    """Session of a non GET route that only reads (e.g. a beacon): a replica unless the client is pinned, never pins"""
+    factory = AsyncSessionLocal if PRIMARY_PIN_COOKIE in request.cookies else next(_replica_sessions)
+    async with factory() as db:
         yield db
-    finally:
-        db.close()
-Base = declarative_base()
\ No newline at end of file
+# create a base class for our models
+Base = declarative_base()
@@ -1,9 +1,18 @@
 from fastapi import FastAPI
-from database import engine, get_db,Base
-from models import Base
+from database import dispose_async_engines, get_db, get_pool_metrics
 from fastapi.middleware.cors import CORSMiddleware
 from routes import  leads, leadMagnet, landingPage, emailTamplate
+from services.smtpPool import close_smtp_pool
+from services.worker import background_worker
+from services.outboxDispatcher import outbox_dispatcher
+from services.dripScheduler import drip_scheduler
+from services.leadIngestBuffer import lead_ingest_buffer
+from services.leadPartitions import lead_partitions
+from services.statsCompactor import stats_compactor
+from services.leadMagnetRanking import lead_magnet_ranker
+from config import LEAD_INGEST_BUFFER
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 # from api import router as api_router    
@@ -15,13 +24,30 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Create database tables
-    logger.info("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
+    # Startup: the schema is created and upgraded by `alembic upgrade head`
+    # leads can only be inserted once the partition of the current month exists
+    await asyncio.to_thread(lead_partitions.ensure_partitions)
+    background_worker.start()
+    outbox_dispatcher.start(background_worker)
+    drip_scheduler.start(background_worker)
+    lead_partitions.start(background_worker)
+    stats_compactor.start(background_worker)
+    if LEAD_INGEST_BUFFER:
+        lead_ingest_buffer.start()
+    lead_magnet_ranker.start()
     yield
     # Shutdown: Cleanup if needed
     logger.info("Shutting down application...")
+    await lead_ingest_buffer.stop()
+    await lead_magnet_ranker.stop()
+    stats_compactor.stop()
+    lead_partitions.stop()
+    drip_scheduler.stop()
+    outbox_dispatcher.stop()
+    background_worker.stop()
+    outbox_dispatcher.sender.close()
+    close_smtp_pool()
+    await dispose_async_engines()
 app = FastAPI(title="Genie OPs test", version="1.0.0",lifespan=lifespan)
 
 app.add_middleware(
@@ -30,6 +56,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # next page cursor of list endpoints
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
@@ -37,8 +65,6 @@ app.include_router(leadMagnet.router, prefix="/api")
 app.include_router(leads.router, prefix="/api")
 app.include_router(landingPage.router, prefix="/api")
 app.include_router(emailTamplate.router, prefix="/api")
-# Create the database tables
-Base.metadata.create_all(bind=engine)
 #routes
 # app.include_router(api_router)
 
@@ -64,6 +90,12 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+# Connection pool usage of the API and background worker engines
+@app.get("/metrics/db-pool")
+async def db_pool_metrics():
+    """Checkouts, wait times and overflow usage of the database connection pools"""
+    return get_pool_metrics()
+
 # API documentation available at /docs (Swagger UI) and /redoc (ReDoc)
 
 if __name__ == "__main__":
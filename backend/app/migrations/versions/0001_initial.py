@@ -0,0 +1,92 @@
+"""initial schema, the tables of the app before the email outbox
+
+lead_magnet, leads, landing_pages, email_templates and upgrade_offers, as
+Base.metadata.create_all created them.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 22:21:52.203188
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('lead_magnet',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('type', sa.Enum('checklist', 'template', 'calculator', 'report', name='leadmagnettypeenum'), nullable=False),
+    sa.Column('value_promise', sa.Text(), nullable=True),
+    sa.Column('conversion_score', sa.Integer(), nullable=False),
+    sa.Column('content', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_lead_magnet_id'), 'lead_magnet', ['id'], unique=False)
+    op.create_table('email_templates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.Column('sequence_number', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['lead_magnet_id'], ['lead_magnet.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_email_templates_id'), 'email_templates', ['id'], unique=False)
+    op.create_table('landing_pages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.Column('headline', sa.String(), nullable=False),
+    sa.Column('value', sa.Text(), nullable=True),
+    sa.Column('cta', sa.String(), nullable=False),
+    sa.Column('form_field', sa.JSON(), nullable=True),
+    sa.Column('thank_you_page', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['lead_magnet_id'], ['lead_magnet.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_landing_pages_id'), 'landing_pages', ['id'], unique=False)
+    op.create_table('leads',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['lead_magnet_id'], ['lead_magnet.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_index(op.f('ix_leads_id'), 'leads', ['id'], unique=False)
+    op.create_table('upgrade_offers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('link', sa.String(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['lead_magnet_id'], ['lead_magnet.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_upgrade_offers_id'), 'upgrade_offers', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_upgrade_offers_id'), table_name='upgrade_offers')
+    op.drop_table('upgrade_offers')
+    op.drop_index(op.f('ix_leads_id'), table_name='leads')
+    op.drop_table('leads')
+    op.drop_index(op.f('ix_landing_pages_id'), table_name='landing_pages')
+    op.drop_table('landing_pages')
+    op.drop_index(op.f('ix_email_templates_id'), table_name='email_templates')
+    op.drop_table('email_templates')
+    op.drop_index(op.f('ix_lead_magnet_id'), table_name='lead_magnet')
+    op.drop_table('lead_magnet')
+    # drop_table leaves the enum type behind
+    op.execute('DROP TYPE IF EXISTS leadmagnettypeenum')
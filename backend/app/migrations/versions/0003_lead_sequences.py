@@ -0,0 +1,39 @@
+"""lead_sequences table, drip state of the nurture sequences
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 22:21:53.611032
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('lead_sequences',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('lead_id', sa.Integer(), nullable=False),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.Column('next_position', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('next_sequence_number', sa.Integer(), nullable=False),
+    sa.Column('next_send_at', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('status', sa.Enum('active', 'completed', 'cancelled', name='sequencestatusenum'), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('lead_id')
+    )
+    op.create_index('ix_lead_sequences_active_next_send_at', 'lead_sequences', ['next_send_at'], unique=False, postgresql_where=sa.text("status = 'active'"))
+    op.create_index(op.f('ix_lead_sequences_id'), 'lead_sequences', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_lead_sequences_id'), table_name='lead_sequences')
+    op.drop_index('ix_lead_sequences_active_next_send_at', table_name='lead_sequences', postgresql_where=sa.text("status = 'active'"))
+    op.drop_table('lead_sequences')
+    op.execute('DROP TYPE IF EXISTS sequencestatusenum')
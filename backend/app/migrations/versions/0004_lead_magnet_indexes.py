@@ -0,0 +1,44 @@
+"""lead_magnet_id lookup and keyset pagination indexes
+
+Built with CREATE INDEX CONCURRENTLY so existing deployments keep taking
+writes while they build; IF NOT EXISTS skips the ones create_all already
+made on databases created after the models declared them.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 22:30:04.118320
+"""
+from alembic import op
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns)
+INDEXES = [
+    # lead_magnet_id lookups and ON DELETE CASCADE from lead_magnet
+    ('ix_landing_pages_lead_magnet_id', 'landing_pages', ['lead_magnet_id']),
+    ('ix_upgrade_offers_lead_magnet_id', 'upgrade_offers', ['lead_magnet_id']),
+    ('ix_email_templates_lead_magnet_id_sequence_number', 'email_templates', ['lead_magnet_id', 'sequence_number']),
+    ('ix_leads_lead_magnet_id_created_at_id', 'leads', ['lead_magnet_id', 'created_at', 'id']),
+    # keyset pagination of the list endpoints
+    ('ix_lead_magnet_created_at_id', 'lead_magnet', ['created_at', 'id']),
+    ('ix_leads_created_at_id', 'leads', ['created_at', 'id']),
+    ('ix_landing_pages_created_at_id', 'landing_pages', ['created_at', 'id']),
+    ('ix_email_templates_created_at_id', 'email_templates', ['created_at', 'id']),
+]
+
+
+def upgrade():
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
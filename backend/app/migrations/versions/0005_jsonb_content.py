@@ -0,0 +1,50 @@
+"""JSONB lead_magnet.content and landing_pages.form_field with GIN indexes
+
+The type change rewrites both tables under an exclusive lock, they only hold
+one row per lead magnet / landing page. JSON null values become SQL NULL.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 22:40:12.530871
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# (table, column, GIN index)
+COLUMNS = [
+    ('lead_magnet', 'content', 'ix_lead_magnet_content'),
+    ('landing_pages', 'form_field', 'ix_landing_pages_form_field'),
+]
+
+
+def upgrade():
+    for table, column, _ in COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=JSONB(),
+            existing_nullable=True,
+            postgresql_using=f"nullif({column}::jsonb, 'null'::jsonb)",
+        )
+    with op.get_context().autocommit_block():
+        for table, column, index in COLUMNS:
+            op.create_index(index, table, [column], postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for table, _, index in COLUMNS:
+            op.drop_index(index, table_name=table, postgresql_concurrently=True, if_exists=True)
+    for table, column, _ in COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.JSON(),
+            existing_nullable=True,
+            postgresql_using=f"{column}::json",
+        )
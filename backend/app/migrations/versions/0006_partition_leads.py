@@ -0,0 +1,114 @@
+"""Partition leads by month of created_at, lead_emails registry
+
+Postgres can't turn a table into a partitioned one in place: leads is copied
+into a new partitioned table under an exclusive lock, so writes to it wait for
+the whole copy. Partitions cover the months of the existing rows up to three
+months ahead; the app's maintenance job creates the later ones. A unique index
+on a partitioned table must include the partition key, so email uniqueness
+moves to the lead_emails registry.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 23:05:41.207316
+"""
+from datetime import date, datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    op.drop_index('ix_leads_id', table_name='leads', if_exists=True)
+    op.drop_index('ix_leads_created_at_id', table_name='leads', if_exists=True)
+    op.drop_index('ix_leads_lead_magnet_id_created_at_id', table_name='leads', if_exists=True)
+    op.execute("LOCK TABLE leads IN EXCLUSIVE MODE")
+    op.rename_table('leads', 'leads_unpartitioned')
+    op.execute("ALTER TABLE leads_unpartitioned DROP CONSTRAINT leads_pkey, DROP CONSTRAINT leads_lead_magnet_id_fkey")
+
+    op.create_table('leads',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('leads_id_seq')"), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['lead_magnet_id'], ['lead_magnet.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id', 'created_at'),
+    postgresql_partition_by='RANGE (created_at)'
+    )
+    first = op.get_bind().execute(sa.text("SELECT min(created_at) FROM leads_unpartitioned")).scalar()
+    now = datetime.now(timezone.utc)
+    month = date((first or now).year, (first or now).month, 1)
+    last = _add_months(date(now.year, now.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE leads_{month.year:04d}_{month.month:02d} PARTITION OF leads "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+        month = _add_months(month, 1)
+    op.execute("CREATE TABLE leads_default PARTITION OF leads DEFAULT")
+    op.execute(
+        "INSERT INTO leads (id, name, email, created_at, lead_magnet_id) "
+        "SELECT id, name, email, coalesce(created_at, now()), lead_magnet_id FROM leads_unpartitioned"
+    )
+
+    op.create_table('lead_emails',
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('lead_id', sa.Integer(), nullable=False),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['lead_magnet_id'], ['lead_magnet.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('email')
+    )
+    op.execute(
+        "INSERT INTO lead_emails (email, lead_id, lead_magnet_id, created_at) "
+        "SELECT email, id, lead_magnet_id, created_at FROM leads"
+    )
+    op.create_index(op.f('ix_lead_emails_lead_magnet_id'), 'lead_emails', ['lead_magnet_id'], unique=False)
+
+    # indexes after the copy, built once per partition
+    op.create_index('ix_leads_created_at_id', 'leads', ['created_at', 'id'], unique=False)
+    op.create_index('ix_leads_lead_magnet_id_created_at_id', 'leads', ['lead_magnet_id', 'created_at', 'id'], unique=False)
+    op.execute("ALTER SEQUENCE leads_id_seq OWNED BY leads.id")
+    op.drop_table('leads_unpartitioned')
+
+
+def downgrade():
+    # archived partitions (archive schema or parquet files) are not brought back
+    op.execute("LOCK TABLE leads IN EXCLUSIVE MODE")
+    op.rename_table('leads', 'leads_partitioned')
+    op.drop_index('ix_leads_created_at_id', table_name='leads_partitioned')
+    op.drop_index('ix_leads_lead_magnet_id_created_at_id', table_name='leads_partitioned')
+    op.execute("ALTER TABLE leads_partitioned DROP CONSTRAINT leads_pkey, DROP CONSTRAINT leads_lead_magnet_id_fkey")
+    op.create_table('leads',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('leads_id_seq')"), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['lead_magnet_id'], ['lead_magnet.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    op.execute(
+        "INSERT INTO leads (id, name, email, created_at, lead_magnet_id) "
+        "SELECT id, name, email, created_at, lead_magnet_id FROM leads_partitioned"
+    )
+    op.create_index(op.f('ix_leads_id'), 'leads', ['id'], unique=False)
+    op.create_index('ix_leads_created_at_id', 'leads', ['created_at', 'id'], unique=False)
+    op.create_index('ix_leads_lead_magnet_id_created_at_id', 'leads', ['lead_magnet_id', 'created_at', 'id'], unique=False)
+    op.execute("ALTER SEQUENCE leads_id_seq OWNED BY leads.id")
+    op.drop_table('leads_partitioned')
+    op.drop_index(op.f('ix_lead_emails_lead_magnet_id'), table_name='lead_emails')
+    op.drop_table('lead_emails')
@@ -0,0 +1,55 @@
+"""Hourly lead magnet stats rollup and its deltas table
+
+The rollup is backfilled from leads and from the sent outbox rows; archived
+lead partitions are not counted.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 23:31:09.584102
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('lead_magnet_stats',
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('leads', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('emails_sent', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['lead_magnet_id'], ['lead_magnet.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('lead_magnet_id', 'bucket')
+    )
+    op.create_table('lead_magnet_stats_deltas',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('lead_magnet_id', sa.Integer(), nullable=False),
+    sa.Column('bucket', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('leads', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('emails_sent', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_lead_magnet_stats_deltas_lead_magnet_id_bucket', 'lead_magnet_stats_deltas', ['lead_magnet_id', 'bucket'], unique=False)
+    op.execute("""
+        INSERT INTO lead_magnet_stats (lead_magnet_id, bucket, leads, emails_sent)
+        SELECT lead_magnet_id, bucket, sum(leads), sum(emails_sent) FROM (
+            SELECT lead_magnet_id, date_trunc('hour', created_at, 'UTC') AS bucket, 1 AS leads, 0 AS emails_sent
+            FROM leads
+            UNION ALL
+            SELECT o.lead_magnet_id, date_trunc('hour', o.sent_at, 'UTC'), 0, 1
+            FROM email_outbox o JOIN lead_magnet lm ON lm.id = o.lead_magnet_id
+            WHERE o.status = 'sent' AND o.sent_at IS NOT NULL
+        ) counts
+        GROUP BY lead_magnet_id, bucket
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_lead_magnet_stats_deltas_lead_magnet_id_bucket', table_name='lead_magnet_stats_deltas')
+    op.drop_table('lead_magnet_stats_deltas')
+    op.drop_table('lead_magnet_stats')
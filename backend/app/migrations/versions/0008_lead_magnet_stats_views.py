@@ -0,0 +1,26 @@
+"""Landing page views in the lead magnet stats
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 23:52:27.731460
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+TABLES = ['lead_magnet_stats', 'lead_magnet_stats_deltas']
+
+
+def upgrade():
+    for table in TABLES:
+        op.add_column(table, sa.Column('views', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, 'views')
@@ -1,5 +1,6 @@
-from sqlalchemy import  Integer, Text, String,ForeignKey,TIMESTAMP, JSON,Column,Enum as SQLEnum
-from sqlalchemy.sql import func
+from sqlalchemy import  Integer, BigInteger, Text, String,ForeignKey,TIMESTAMP,Column,Index,Sequence,Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func, text
 from database import Base
 from enum import Enum
 from sqlalchemy.orm import relationship
@@ -16,34 +17,91 @@ class LeadMagnet(Base):
     type = Column(SQLEnum(LeadMagnetTypeEnum), nullable=False)
     value_promise = Column(Text, nullable=True)
     conversion_score = Column(Integer, nullable=False)
-    content = Column(JSON, nullable=True)
+    # JSONB so content can be filtered through the GIN index; None is stored as SQL NULL
+    content = Column(JSONB(none_as_null=True), nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     #relationships
     landing_pages = relationship("LandingPage",  back_populates="lead_magnet")
     leads = relationship("Lead", back_populates="lead_magnet")
     email_templates = relationship("EmailTemplate", back_populates="lead_magnet")
     upgrade_offers = relationship("UpgradeOffer", back_populates="lead_magnet")
+    # keyset pagination (see pagination.py)
+    __table_args__ = (
+        Index("ix_lead_magnet_created_at_id", "created_at", "id"),
+        # containment (@>) and key (?) filters on content
+        Index("ix_lead_magnet_content", "content", postgresql_using="gin"),
+    )
+leads_id_seq = Sequence("leads_id_seq")
 class Lead(Base):
+    # partitioned by month of created_at (see services/leadPartitions.py), so
+    # queries filtering on created_at only read the matching partitions
     __tablename__ = "leads"
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, leads_id_seq, server_default=leads_id_seq.next_value(), primary_key=True)
     name = Column(String, nullable=False)
-    email = Column(String, nullable=False, unique=True)
-    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    # unique through lead_emails, a partitioned table can't have a unique index on email alone
+    email = Column(String, nullable=False)
+    # part of the primary key because it is the partition key
+    created_at = Column(TIMESTAMP(timezone=True), primary_key=True, server_default=func.now())
     lead_magnet_id = Column(Integer, ForeignKey("lead_magnet.id", ondelete="CASCADE"), nullable=False)
     #relationship to lead magnet
     lead_magnet = relationship("LeadMagnet", back_populates="leads")
+    # keyset pagination of all leads and of a lead magnet's leads; the second
+    # one also serves lead_magnet_id lookups and cascade deletes
+    __table_args__ = (
+        Index("ix_leads_created_at_id", "created_at", "id"),
+        Index("ix_leads_lead_magnet_id_created_at_id", "lead_magnet_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+class LeadEmail(Base):
+    # registry of lead emails, keeps them unique across every partition of leads
+    # (archived ones included); written in the same statement as the lead
+    __tablename__ = "lead_emails"
+    email = Column(String, primary_key=True)
+    lead_id = Column(Integer, nullable=False)
+    lead_magnet_id = Column(Integer, ForeignKey("lead_magnet.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False)
+class LeadMagnetStats(Base):
+    # hourly counts per lead magnet read by the stats endpoint; the compaction
+    # job (services/statsCompactor.py) folds lead_magnet_stats_deltas into it
+    __tablename__ = "lead_magnet_stats"
+    lead_magnet_id = Column(Integer, ForeignKey("lead_magnet.id", ondelete="CASCADE"), primary_key=True)
+    # start of the hour, UTC
+    bucket = Column(TIMESTAMP(timezone=True), primary_key=True)
+    leads = Column(Integer, nullable=False, server_default="0")
+    emails_sent = Column(Integer, nullable=False, server_default="0")
+    # landing page views, written by the ranking service (services/leadMagnetRanking.py)
+    views = Column(Integer, nullable=False, server_default="0")
+class LeadMagnetStatsDelta(Base):
+    # append only: writers add a row in the transaction of the change instead of
+    # updating the shared rollup row, so concurrent captures don't wait on each other.
+    # No FK, like the outbox it is written for lead magnets that may be gone
+    __tablename__ = "lead_magnet_stats_deltas"
+    id = Column(BigInteger, primary_key=True)
+    lead_magnet_id = Column(Integer, nullable=False)
+    bucket = Column(TIMESTAMP(timezone=True), nullable=False)
+    leads = Column(Integer, nullable=False, server_default="0")
+    emails_sent = Column(Integer, nullable=False, server_default="0")
+    views = Column(Integer, nullable=False, server_default="0")
+    __table_args__ = (
+        # stats reads add the deltas not compacted yet
+        Index("ix_lead_magnet_stats_deltas_lead_magnet_id_bucket", "lead_magnet_id", "bucket"),
+    )
 class LandingPage(Base):
     __tablename__ = "landing_pages"
     id = Column(Integer, primary_key=True, index=True)
-    lead_magnet_id = Column(Integer, ForeignKey("lead_magnet.id", ondelete="CASCADE"), nullable=False)
+    lead_magnet_id = Column(Integer, ForeignKey("lead_magnet.id", ondelete="CASCADE"), nullable=False, index=True)
     headline = Column(String, nullable=False)
     value = Column(Text, nullable=True)
     cta = Column(String, nullable=False)
-    form_field = Column(JSON, nullable=True)
+    form_field = Column(JSONB(none_as_null=True), nullable=True)
     thank_you_page = Column(Text, nullable=True)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     #relationship to lead magnet
     lead_magnet = relationship("LeadMagnet", back_populates="landing_pages")
+    __table_args__ = (
+        Index("ix_landing_pages_created_at_id", "created_at", "id"),
+        Index("ix_landing_pages_form_field", "form_field", postgresql_using="gin"),
+    )
 class EmailTemplate(Base):
     __tablename__ = "email_templates"
     id = Column(Integer, primary_key=True, index=True)
@@ -54,13 +112,75 @@ class EmailTemplate(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
     # relationship to lead magnet 
     lead_magnet = relationship("LeadMagnet", back_populates="email_templates")
+    __table_args__ = (
+        Index("ix_email_templates_created_at_id", "created_at", "id"),
+        # sequences of a lead magnet, in order
+        Index("ix_email_templates_lead_magnet_id_sequence_number", "lead_magnet_id", "sequence_number"),
+    )
 class UpgradeOffer(Base):
     __tablename__ = "upgrade_offers"
     id = Column(Integer, primary_key=True, index=True)
-    lead_magnet_id = Column(Integer, ForeignKey("lead_magnet.id", ondelete="CASCADE"), nullable=False)
+    lead_magnet_id = Column(Integer, ForeignKey("lead_magnet.id", ondelete="CASCADE"), nullable=False, index=True)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
     link = Column(String, nullable=False)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
      # relationship to lead magnet 
-    lead_magnet = relationship("LeadMagnet", back_populates="upgrade_offers")
\ No newline at end of file
+    lead_magnet = relationship("LeadMagnet", back_populates="upgrade_offers")
+class OutboxStatusEnum(str, Enum):
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    failed = "failed"
+class EmailOutbox(Base):
+    # transactional outbox: one row per email to deliver, written in the same
+    # transaction as the change that triggers it and delivered by the dispatcher
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    # "<kind>:<lead_id>:<template or lead magnet id>", makes enqueueing idempotent
+    idempotency_key = Column(String, nullable=False, unique=True)
+    kind = Column(String, nullable=False)
+    # no FK to leads/templates: the outbox is a delivery log and outlives them
+    lead_id = Column(Integer, nullable=False, index=True)
+    lead_magnet_id = Column(Integer, nullable=False)
+    email_template_id = Column(Integer, nullable=True, index=True)
+    to_email = Column(String, nullable=False)
+    to_name = Column(String, nullable=True)
+    status = Column(SQLEnum(OutboxStatusEnum), nullable=False, default=OutboxStatusEnum.pending)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    # lease of a dispatcher that claimed the row; expired leases are reclaimed after a crash
+    locked_until = Column(TIMESTAMP(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    sent_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+class SequenceStatusEnum(str, Enum):
+    active = "active"
+    completed = "completed"
+    cancelled = "cancelled"
+class LeadSequence(Base):
+    # drip state of a lead's nurture sequence: the scheduler sends the template
+    # at next_position, in (sequence_number, id) order, once next_send_at is due.
+    # Templates can share a sequence_number, next_sequence_number is informative
+    __tablename__ = "lead_sequences"
+    id = Column(Integer, primary_key=True, index=True)
+    lead_id = Column(Integer, nullable=False, unique=True)
+    lead_magnet_id = Column(Integer, nullable=False)
+    next_position = Column(Integer, nullable=False, default=0, server_default="0")
+    next_sequence_number = Column(Integer, nullable=False, default=1)
+    next_send_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    status = Column(SQLEnum(SequenceStatusEnum), nullable=False, default=SequenceStatusEnum.active)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
+    __table_args__ = (
+        # the sweep only ever reads due active sequences
+        Index(
+            "ix_lead_sequences_active_next_send_at",
+            "next_send_at",
+            postgresql_where=text("status = 'active'"),
+        ),
+    )
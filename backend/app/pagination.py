@@ -0,0 +1,64 @@
+"""Keyset (cursor) pagination on (created_at, id).
+
+A cursor is the opaque, url safe encoding of the last row of a page; the next
+page is a "(created_at, id) > cursor" range scan on a (created_at, id) index,
+so deep pages cost the same as the first one, unlike OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(row) -> str:
+    raw = json.dumps([row.created_at.isoformat(), row.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raise ValueError for cursors this module did not produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_page(query: Select, model, cursor: Optional[str], skip: int, limit: int, descending: bool = False) -> Select:
+    """Order query by (created_at, id) and start after cursor, or at skip without one"""
+    key = tuple_(model.created_at, model.id)
+    if descending:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at, model.id)
+    if cursor:
+        after = decode_cursor(cursor)
+        query = query.where(key < after if descending else key > after)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def next_cursor(rows, limit: int) -> Optional[str]:
+    """Cursor of the page after rows, None once the last page was returned"""
+    if limit and len(rows) == limit:
+        return encode_cursor(rows[-1])
+    return None
+
+def cursor_query(cursor: Optional[str] = None) -> Optional[str]:
+    """`cursor` query parameter of list endpoints, rejects malformed cursors with 400"""
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return cursor
+
+def set_next_cursor(response: Response, rows, limit: int):
+    """Send the cursor of the next page in the X-Next-Cursor header"""
+    cursor = next_cursor(rows, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return rows
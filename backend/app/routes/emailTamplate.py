@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
-import crud
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import async_crud as crud
 import schemas
 from database import get_db
+from pagination import cursor_query, set_next_cursor
+from models import OutboxStatusEnum
+from services.outboxDispatcher import outbox_dispatcher
 from services.llmService import LLMService
-from services.emails import EmailService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,18 +15,17 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/email-templates", tags=["email-templates"])
 
 llm_service = LLMService()
-email_service = EmailService()
 
 # ==================== CRUD OPERATIONS ====================
 
 @router.post("/", response_model=schemas.EmailTemplate, status_code=status.HTTP_201_CREATED)
 async def create_email_template(
     email_template: schemas.EmailTemplateCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new email template"""
     # Check if lead magnet exists
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=email_template.lead_magnet_id)
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=email_template.lead_magnet_id)
     if not lead_magnet:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -32,7 +33,7 @@ async def create_email_template(
         )
     
     try:
-        return crud.create_email_template(db=db, email_template=email_template)
+        return await crud.create_email_template(db=db, email_template=email_template)
     except Exception as e:
         logger.error(f"Error creating email template: {str(e)}")
         raise HTTPException(
@@ -42,20 +43,26 @@ async def create_email_template(
 
 @router.get("/", response_model=List[schemas.EmailTemplate])
 async def get_email_templates(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Depends(cursor_query),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all email templates"""
-    return crud.get_email_templates(db=db, skip=skip, limit=limit)
+    """
+    Get all email templates.
+    Pass the X-Next-Cursor response header as `cursor` to get the next page.
+    """
+    email_templates = await crud.get_email_templates(db=db, skip=skip, limit=limit, cursor=cursor)
+    return set_next_cursor(response, email_templates, limit)
 
 @router.get("/{email_template_id}", response_model=schemas.EmailTemplate)
 async def get_email_template(
     email_template_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific email template by ID"""
-    email_template = crud.get_email_template(db=db, email_template_id=email_template_id)
+    email_template = await crud.get_email_template(db=db, email_template_id=email_template_id)
     if not email_template:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -66,10 +73,10 @@ async def get_email_template(
 @router.get("/by-lead-magnet/{lead_magnet_id}", response_model=List[schemas.EmailTemplate])
 async def get_email_templates_by_lead_magnet(
     lead_magnet_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all email templates for a specific lead magnet"""
-    return crud.get_email_templates_by_lead_magnet(
+    return await crud.get_email_templates_by_lead_magnet(
         db=db,
         lead_magnet_id=lead_magnet_id
     )
@@ -78,10 +85,10 @@ async def get_email_templates_by_lead_magnet(
 async def update_email_template(
     email_template_id: int,
     email_template_update: schemas.EmailTemplateCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update an email template"""
-    email_template = crud.update_email_template(
+    email_template = await crud.update_email_template(
         db=db,
         email_template_id=email_template_id,
         email_template_update=email_template_update
@@ -96,10 +103,10 @@ async def update_email_template(
 @router.delete("/{email_template_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_email_template(
     email_template_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete an email template"""
-    success = crud.delete_email_template(db=db, email_template_id=email_template_id)
+    success = await crud.delete_email_template(db=db, email_template_id=email_template_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -113,13 +120,13 @@ async def delete_email_template(
 async def generate_email_sequence(
     lead_magnet_id: int,
     num_emails: int = 5,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate a nurture email sequence for a lead magnet using AI
     """
     # Get the lead magnet
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
     if not lead_magnet:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -127,7 +134,7 @@ async def generate_email_sequence(
         )
     
     # Check if sequence already exists
-    existing = crud.get_email_templates_by_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+    existing = await crud.get_email_templates_by_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -145,19 +152,26 @@ async def generate_email_sequence(
         # Generate email sequence
         emails = llm_service.generate_nurture_emails(lead_magnet_dict, num_emails)
         
-        # Save emails to database
-        created_templates = []
-        for email_data in emails:
-            email_template_create = schemas.EmailTemplateCreate(
+        # Keep the numbers the model returned; the drip sends templates in
+        # (sequence_number, id) order, so gaps and duplicates still send every email
+        numbers = [email_data.get("sequence_number") for email_data in emails]
+        if sorted(n for n in numbers if n is not None) != list(range(1, len(emails) + 1)):
+            logger.warning(
+                f"Generated sequence for lead magnet {lead_magnet_id} has gaps or duplicates "
+                f"in its sequence numbers: {numbers}"
+            )
+        
+        # Save the whole sequence in one insert
+        email_templates = [
+            schemas.EmailTemplateCreate(
                 lead_magnet_id=lead_magnet_id,
-                sequence_number=email_data.get("sequence_number", 1),
+                sequence_number=email_data.get("sequence_number") or position,
                 subject=email_data.get("subject", ""),
                 body=email_data.get("body", "")
             )
-            created_template = crud.create_email_template(db=db, email_template=email_template_create)
-            created_templates.append(created_template)
-        
-        return created_templates
+            for position, email_data in enumerate(emails, start=1)
+        ]
+        return await crud.bulk_create_email_templates(db=db, email_templates=email_templates)
         
     except Exception as e:
         logger.error(f"Error generating email sequence: {str(e)}")
@@ -167,71 +181,69 @@ async def generate_email_sequence(
         )
 
 # ==================== SEND EMAILS ====================
+# Emails are queued in the outbox table and delivered by the outbox dispatcher
 
 @router.post("/{email_template_id}/send-to-leads")
 async def send_email_to_leads(
     email_template_id: int,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Send email template to all leads associated with its lead magnet
+    Send email template to all leads associated with its lead magnet.
+    Leads that were already sent this template are skipped; follow progress
+    with /{email_template_id}/delivery-status.
     """
     # Get email template
-    email_template = crud.get_email_template(db=db, email_template_id=email_template_id)
+    email_template = await crud.get_email_template(db=db, email_template_id=email_template_id)
     if not email_template:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Email template with id {email_template_id} not found"
         )
     
-    # Get all leads for this lead magnet
-    leads = crud.get_leads_by_lead_magnet(
+    # Count leads for this lead magnet, they are streamed into the outbox in the background
+    leads_count = await crud.count_leads_by_lead_magnet(
         db=db,
         lead_magnet_id=email_template.lead_magnet_id
     )
     
-    if not leads:
+    if not leads_count:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No leads found for this lead magnet"
         )
     
-    # Convert to dicts
-    email_template_dict = {
-        "subject": email_template.subject,
-        "body": email_template.body,
-        "sequence_number": email_template.sequence_number
-    }
-    
-    leads_dict = [
-        {"id": lead.id, "name": lead.name, "email": lead.email}
-        for lead in leads
-    ]
-    
-    # Send emails in background
-    background_tasks.add_task(
-        email_service.send_bulk_emails,
-        leads_dict,
-        email_template_dict
-    )
+    outbox_dispatcher.submit_campaign(email_template_id)
     
     return {
-        "message": f"Sending emails to {len(leads)} leads in background",
-        "leads_count": len(leads)
+        "message": f"Queueing emails for {leads_count} leads in background",
+        "leads_count": leads_count
+    }
+
+@router.get("/{email_template_id}/delivery-status")
+async def get_delivery_status(
+    email_template_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Count outbox emails of a template by delivery status (pending, sending, sent, failed)"""
+    counts = await crud.get_outbox_status_counts(db=db, email_template_id=email_template_id)
+    return {
+        "email_template_id": email_template_id,
+        "total": sum(counts.values()),
+        **{s.value: counts.get(s.value, 0) for s in OutboxStatusEnum}
     }
 
 @router.post("/send-sequence-to-lead/{lead_id}")
 async def send_sequence_to_lead(
     lead_id: int,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Send entire email sequence to a specific lead
+    Start the email sequence of a specific lead.
+    The first email goes out right away, each next one a configured delay after the previous.
     """
     # Get lead
-    lead = crud.get_lead(db=db, lead_id=lead_id)
+    lead = await crud.get_lead(db=db, lead_id=lead_id)
     if not lead:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -239,7 +251,7 @@ async def send_sequence_to_lead(
         )
     
     # Get email templates for this lead's lead magnet
-    email_templates = crud.get_email_templates_by_lead_magnet(
+    email_templates = await crud.get_email_templates_by_lead_magnet(
         db=db,
         lead_magnet_id=lead.lead_magnet_id
     )
@@ -250,23 +262,35 @@ async def send_sequence_to_lead(
             detail="No email templates found for this lead magnet"
         )
     
-    # Convert to dicts
-    lead_dict = {"id": lead.id, "name": lead.name, "email": lead.email}
+    # Schedule the sequence, the drip scheduler sends it
+    sequence = await crud.start_lead_sequence(
+        db=db,
+        lead=lead,
+        first_sequence_number=email_templates[0].sequence_number
+    )
     
-    # Send each email in sequence (in background)
-    for email_template in email_templates:
-        email_dict = {
-            "subject": email_template.subject,
-            "body": email_template.body,
-            "sequence_number": email_template.sequence_number
-        }
-        background_tasks.add_task(
-            email_service.send_nurture_email,
-            lead_dict,
-            email_dict
+    return {
+        "message": f"Scheduled {len(email_templates)} emails to {lead.email}",
+        "emails_count": len(email_templates),
+        "next_sequence_number": sequence.next_sequence_number,
+        "next_send_at": sequence.next_send_at
+    }
+
+@router.get("/sequence-status/{lead_id}")
+async def get_sequence_status(
+    lead_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the drip sequence state of a lead"""
+    sequence = await crud.get_lead_sequence(db=db, lead_id=lead_id)
+    if not sequence:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No sequence scheduled for lead {lead_id}"
         )
-    
     return {
-        "message": f"Sending {len(email_templates)} emails to {lead.email} in background",
-        "emails_count": len(email_templates)
-    }
\ No newline at end of file
+        "lead_id": sequence.lead_id,
+        "status": sequence.status.value,
+        "next_sequence_number": sequence.next_sequence_number,
+        "next_send_at": sequence.next_send_at
+    }
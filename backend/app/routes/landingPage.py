@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-import crud
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import async_crud as crud
 import schemas
-from database import get_db
+from database import get_db, get_read_db
+from pagination import cursor_query, set_next_cursor
 from services.llmService import LLMService
+from services.leadMagnetRanking import lead_magnet_ranker
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,11 +20,11 @@ llm_service = LLMService()
 @router.post("/", response_model=schemas.LandingPage, status_code=status.HTTP_201_CREATED)
 async def create_landing_page(
     landing_page: schemas.LandingPageCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new landing page"""
     # Check if lead magnet exists
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=landing_page.lead_magnet_id)
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=landing_page.lead_magnet_id)
     if not lead_magnet:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -30,7 +32,7 @@ async def create_landing_page(
         )
     
     try:
-        return crud.create_landing_page(db=db, landing_page=landing_page)
+        return await crud.create_landing_page(db=db, landing_page=landing_page)
     except Exception as e:
         logger.error(f"Error creating landing page: {str(e)}")
         raise HTTPException(
@@ -40,20 +42,26 @@ async def create_landing_page(
 
 @router.get("/", response_model=List[schemas.LandingPage])
 async def get_landing_pages(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Depends(cursor_query),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all landing pages"""
-    return crud.get_landing_pages(db=db, skip=skip, limit=limit)
+    """
+    Get all landing pages.
+    Pass the X-Next-Cursor response header as `cursor` to get the next page.
+    """
+    landing_pages = await crud.get_landing_pages(db=db, skip=skip, limit=limit, cursor=cursor)
+    return set_next_cursor(response, landing_pages, limit)
 
 @router.get("/{landing_page_id}", response_model=schemas.LandingPage)
 async def get_landing_page(
     landing_page_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific landing page by ID"""
-    landing_page = crud.get_landing_page(db=db, landing_page_id=landing_page_id)
+    landing_page = await crud.get_landing_page(db=db, landing_page_id=landing_page_id)
     if not landing_page:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -64,10 +72,10 @@ async def get_landing_page(
 @router.get("/by-lead-magnet/{lead_magnet_id}", response_model=schemas.LandingPage)
 async def get_landing_page_by_lead_magnet(
     lead_magnet_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get landing page for a specific lead magnet"""
-    landing_page = crud.get_landing_page_by_lead_magnet(
+    landing_page = await crud.get_landing_page_by_lead_magnet(
         db=db,
         lead_magnet_id=lead_magnet_id
     )
@@ -82,10 +90,10 @@ async def get_landing_page_by_lead_magnet(
 async def update_landing_page(
     landing_page_id: int,
     landing_page_update: schemas.LandingPageCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a landing page"""
-    landing_page = crud.update_landing_page(
+    landing_page = await crud.update_landing_page(
         db=db,
         landing_page_id=landing_page_id,
         landing_page_update=landing_page_update
@@ -97,13 +105,32 @@ async def update_landing_page(
         )
     return landing_page
 
+@router.post("/{landing_page_id}/views", status_code=status.HTTP_204_NO_CONTENT)
+async def record_landing_page_view(
+    landing_page_id: int,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Count a view of a landing page, for the conversion ranking of its lead magnet.
+    Views are counted in memory and written in batches, so the beacon
+    doesn't pin its visitor to the primary database.
+    """
+    landing_page = await crud.get_landing_page(db=db, landing_page_id=landing_page_id)
+    if not landing_page:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Landing page with id {landing_page_id} not found"
+        )
+    lead_magnet_ranker.record_view(landing_page.lead_magnet_id)
+    return None
+
 @router.delete("/{landing_page_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_landing_page(
     landing_page_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a landing page"""
-    success = crud.delete_landing_page(db=db, landing_page_id=landing_page_id)
+    success = await crud.delete_landing_page(db=db, landing_page_id=landing_page_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -116,13 +143,13 @@ async def delete_landing_page(
 @router.post("/{lead_magnet_id}/generate", response_model=schemas.LandingPage, status_code=status.HTTP_201_CREATED)
 async def generate_landing_page(
     lead_magnet_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate landing page copy for a lead magnet using AI
     """
     # Get the lead magnet
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
     if not lead_magnet:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -130,7 +157,7 @@ async def generate_landing_page(
         )
     
     # Check if landing page already exists
-    existing = crud.get_landing_page_by_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+    existing = await crud.get_landing_page_by_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -159,7 +186,7 @@ async def generate_landing_page(
         )
         
         # Save to database
-        return crud.create_landing_page(db=db, landing_page=landing_page_create)
+        return await crud.create_landing_page(db=db, landing_page=landing_page_create)
         
     except Exception as e:
         logger.error(f"Error generating landing page: {str(e)}")
@@ -1,13 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException,status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.responses import StreamingResponse
 from database import get_db
-from typing import List,Dict,Any
+from datetime import datetime
+from typing import List,Dict,Any,Optional
+import json
+from pagination import cursor_query, set_next_cursor
 import schemas 
-import crud
+import async_crud as crud
 import logging
 from services.llmService import LLMService
+from services.leadMagnetRanking import lead_magnet_ranker
 from pydantic import BaseModel
 logger = logging.getLogger(__name__)
 
@@ -54,32 +58,171 @@ async def generate_lead_magnet_ideas(
 @router.post("/", response_model=schemas.LeadMagnet, status_code=status.HTTP_201_CREATED)
 async def create_lead_magnet(
     lead_magnet: schemas.LeadMagnetCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new lead magnet"""
     try:
-        return crud.create_lead_magnet(db=db, lead_magnet=lead_magnet)
+        return await crud.create_lead_magnet(db=db, lead_magnet=lead_magnet)
     except Exception as e:
         logger.error(f"Error creating lead magnet: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create lead magnet: {str(e)}"
         )
+@router.post("/bulk", response_model=List[schemas.LeadMagnet], status_code=status.HTTP_201_CREATED)
+async def bulk_create_lead_magnets(
+    lead_magnets: List[schemas.LeadMagnetCreate],
+    db: AsyncSession = Depends(get_db)
+):
+    """Create several lead magnets at once, e.g. the accepted generated ideas"""
+    try:
+        return await crud.bulk_create_lead_magnets(db=db, lead_magnets=lead_magnets)
+    except Exception as e:
+        logger.error(f"Error creating lead magnets: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create lead magnets: {str(e)}"
+        )
 @router.get("/", response_model=List[schemas.LeadMagnet])
 async def get_lead_magnets(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = Depends(cursor_query),
+    content_type: Optional[str] = None,
+    content_format: Optional[str] = None,
+    content_key: Optional[str] = None,
+    content_contains: Optional[str] = None,
+    min_steps: Optional[int] = None,
+    max_steps: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get all lead magnets, newest first.
+    Pass the X-Next-Cursor response header as `cursor` to get the next page.
+    Filters on the generated content: its "type" and "format" fields, a
+    top-level key it must have, a JSON object it must contain
+    (e.g. {"format": "Google Docs Template"}) and its number of steps.
+    """
+    contains = {}
+    if content_contains:
+        try:
+            contains = json.loads(content_contains)
+        except ValueError:
+            contains = None
+        if not isinstance(contains, dict):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="content_contains must be a JSON object"
+            )
+    if content_type:
+        contains["type"] = content_type
+    if content_format:
+        contains["format"] = content_format
+    lead_magnets = await crud.get_lead_magnets(
+        db=db,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        content_contains=contains,
+        content_key=content_key,
+        min_steps=min_steps,
+        max_steps=max_steps
+    )
+    return set_next_cursor(response, lead_magnets, limit)    
+@router.get("/funnels", response_model=List[schemas.LeadMagnetFunnel])
+async def get_lead_magnet_funnels(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Depends(cursor_query),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Funnels of a page of lead magnets, newest first, paginated like GET /lead-magnets
+    """
+    funnels = await crud.get_lead_magnet_funnels(db=db, skip=skip, limit=limit, cursor=cursor)
+    return set_next_cursor(response, funnels, limit)
+@router.get("/ranking", response_model=List[schemas.LeadMagnetRank])
+async def get_lead_magnet_ranking(
+    k: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all lead magnets"""
-    return crud.get_lead_magnets(db=db, skip=skip, limit=limit)    
+    """
+    Top k lead magnets by conversion rate (leads per landing page view) over
+    the last RANKING_WINDOW_HOURS hours, best first. Served from the live
+    in-memory ranking; lead magnets below RANKING_MIN_VIEWS views are left out.
+    """
+    ranking = lead_magnet_ranker.top(k)
+    lead_magnets = await crud.get_lead_magnets_by_ids(db=db, lead_magnet_ids=[rank[0] for rank in ranking])
+    return [
+        schemas.LeadMagnetRank(
+            lead_magnet_id=lead_magnet_id,
+            title=lead_magnets[lead_magnet_id].title,
+            type=lead_magnets[lead_magnet_id].type,
+            views=views,
+            leads=leads,
+            conversion_rate=round(conversion_rate, 4)
+        )
+        # deleted since they were counted
+        for lead_magnet_id, views, leads, conversion_rate in ranking if lead_magnet_id in lead_magnets
+    ]
+@router.get("/{lead_magnet_id}/funnel", response_model=schemas.LeadMagnetFunnel)
+async def get_lead_magnet_funnel(
+    lead_magnet_id: int,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Lead magnet with its landing pages, email templates, upgrade offers and lead count
+    """
+    funnel = await crud.get_lead_magnet_funnel(db=db, lead_magnet_id=lead_magnet_id)
+    if not funnel:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Lead magnet with id {lead_magnet_id} not found"
+        )
+    return funnel
+@router.get("/{lead_magnet_id}/stats", response_model=schemas.LeadMagnetStats)
+async def get_lead_magnet_stats(
+    lead_magnet_id: int,
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Leads captured, emails sent and landing page views per hour/day/week/month
+    (UTC) for the hours in [start, end), all time by default. Served from the
+    hourly rollup.
+    """
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+    if not lead_magnet:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Lead magnet with id {lead_magnet_id} not found"
+        )
+    buckets = await crud.get_lead_magnet_stats(
+        db=db,
+        lead_magnet_id=lead_magnet_id,
+        granularity=granularity,
+        start=start,
+        end=end
+    )
+    return schemas.LeadMagnetStats(
+        lead_magnet_id=lead_magnet_id,
+        granularity=granularity,
+        leads=sum(bucket.leads for bucket in buckets),
+        emails_sent=sum(bucket.emails_sent for bucket in buckets),
+        views=sum(bucket.views for bucket in buckets),
+        buckets=[schemas.LeadMagnetStatsBucket.model_validate(bucket._asdict()) for bucket in buckets]
+    )
 @router.get("/{lead_magnet_id}", response_model=schemas.LeadMagnet)
 async def get_lead_magnet(
     lead_magnet_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific lead magnet by ID"""
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
     if not lead_magnet:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -90,11 +233,11 @@ async def get_lead_magnet(
 async def update_lead_magnet(
     lead_magnet_id: int,
     lead_magnet_update: schemas.LeadMagnetCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a lead magnet"""
     updates = lead_magnet_update.dict(exclude_unset=True)
-    lead_magnet = crud.update_lead_magnet(
+    lead_magnet = await crud.update_lead_magnet(
         db=db,
         lead_magnet_id=lead_magnet_id,
         updates=updates
@@ -105,13 +248,34 @@ async def update_lead_magnet(
             detail=f"Lead magnet with id {lead_magnet_id} not found"
         )
     return lead_magnet
+@router.patch("/{lead_magnet_id}/content", response_model=schemas.LeadMagnet)
+async def patch_lead_magnet_content(
+    lead_magnet_id: int,
+    changes: List[schemas.LeadMagnetContentChange],
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Set values inside the content without resending it,
+    e.g. [{"path": ["steps", "0", "title"], "value": "New title"}]
+    """
+    lead_magnet = await crud.patch_lead_magnet_content(
+        db=db,
+        lead_magnet_id=lead_magnet_id,
+        changes=changes
+    )
+    if not lead_magnet:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Lead magnet with id {lead_magnet_id} not found"
+        )
+    return lead_magnet
 # @router.delete("/{lead_magnet_id}", status_code=status.HTTP_204_NO_CONTENT)
 # async def delete_lead_magnet(
 #     lead_magnet_id: int,
-#     db: Session = Depends(get_db)
+#     db: AsyncSession = Depends(get_db)
 # ):
 #     """Delete a lead magnet"""
-#     success = crud.delete_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+#     success = await crud.delete_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
 #     if not success:
 #         raise HTTPException(
 #             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,13 +286,13 @@ async def update_lead_magnet(
 async def generate_lead_magnet_content(
     lead_magnet_id: int,
     request: ContentRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate content for a lead magnet based on its type
     """
     # Get the lead magnet
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
     if not lead_magnet:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -154,11 +318,11 @@ async def generate_lead_magnet_content(
             )
         
         # Update lead magnet with generated content
-        lead_magnet.content = content
-        db.commit()
-        db.refresh(lead_magnet)
-        
-        return lead_magnet
+        return await crud.update_lead_magnet_content(
+            db=db,
+            lead_magnet_id=lead_magnet_id,
+            content=content
+        )
         
     except Exception as e:
         logger.error(f"Error generating content: {str(e)}")
@@ -172,13 +336,13 @@ async def generate_lead_magnet_content(
 @router.get("/{lead_magnet_id}/download")
 async def download_lead_magnet(
     lead_magnet_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Download the lead magnet as a file (PDF, HTML, etc.)
     """
     # Get the lead magnet
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=lead_magnet_id)
     if not lead_magnet:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
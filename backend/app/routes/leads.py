@@ -1,11 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
-import crud
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import List, Optional
+import async_crud as crud
 import schemas
-from database import get_db
+from database import get_db, pin_to_primary, session_factory_for
+from pagination import cursor_query, set_next_cursor
 from services.assetsSevice import AssetService
 from services.emails import EmailService
+from services.leadIngestBuffer import lead_ingest_buffer
+from services.leadImport import lead_importer, LeadImportError
+from services.leadMagnetRanking import lead_magnet_ranker
+from starlette.concurrency import run_in_threadpool
+from config import LEAD_INGEST_BUFFER, LEAD_EXPORT_CHUNK_SIZE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -20,68 +34,169 @@ email_service = EmailService()
 @router.post("/", response_model=schemas.Lead, status_code=status.HTTP_201_CREATED)
 async def create_lead(
     lead: schemas.LeadCreate,
-    background_tasks: BackgroundTasks,
     send_welcome: bool = True,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new lead (from landing page form submission)
-    Optionally sends welcome email with lead magnet
+    Optionally sends welcome email with lead magnet: the email is queued in the
+    outbox by the same statement that inserts the lead and delivered by the dispatcher.
+    With LEAD_INGEST_BUFFER the lead is written in a batch with concurrent submissions.
     """
-    # Check if lead magnet exists
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=lead.lead_magnet_id)
-    if not lead_magnet:
+    try:
+        if LEAD_INGEST_BUFFER:
+            new_lead = await lead_ingest_buffer.submit(lead, send_welcome)
+        else:
+            new_lead = await crud.create_lead(db=db, lead=lead, enqueue_welcome=send_welcome)
+    except crud.LeadMagnetNotFound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Lead magnet with id {lead.lead_magnet_id} not found"
         )
+    except Exception as e:
+        logger.error(f"Error creating lead: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create lead: {str(e)}"
+        )
     
-    # Check if email already exists
-    existing_lead = crud.get_lead_by_email(db=db, email=lead.email)
-    if existing_lead:
+    if not new_lead:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
-    
+    lead_magnet_ranker.record_lead(new_lead.lead_magnet_id)
+    return new_lead
+
+# ==================== CSV IMPORT / EXPORT ====================
+
+EXPORT_COLUMNS = ["id", "name", "email", "lead_magnet_id", "created_at"]
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def _csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows((row.id, row.name, row.email, row.lead_magnet_id, row.created_at.isoformat()) for row in rows)
+    return buffer.getvalue()
+
+def _ndjson_chunk(rows) -> str:
+    return "".join(
+        json.dumps({**row._asdict(), "created_at": row.created_at.isoformat()}) + "\n"
+        for row in rows
+    )
+
+async def _export_leads(
+    session_factory,
+    format: str,
+    lead_magnet_id: Optional[int],
+    created_from: Optional[datetime],
+    created_to: Optional[datetime]
+):
+    # own session: the request's one is closed before the body is streamed
+    async with session_factory() as db:
+        if format == "csv":
+            yield _csv_chunk([], header=True)
+        async for rows in crud.stream_leads(
+            db,
+            lead_magnet_id=lead_magnet_id,
+            chunk_size=LEAD_EXPORT_CHUNK_SIZE,
+            created_from=created_from,
+            created_to=created_to
+        ):
+            yield _csv_chunk(rows) if format == "csv" else _ndjson_chunk(rows)
+
+@router.get("/export")
+async def export_leads(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    lead_magnet_id: Optional[int] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None
+):
+    """
+    Stream all leads (or those of one lead magnet) as CSV or NDJSON, in id order.
+    Rows are sent as they are read from a server-side cursor, there is no limit.
+    created_from / created_to restrict the export to leads created in [from, to).
+    """
+    filename = f"leads-{lead_magnet_id}.{format}" if lead_magnet_id is not None else f"leads.{format}"
+    return StreamingResponse(
+        _export_leads(session_factory_for(request), format, lead_magnet_id, created_from, created_to),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+@router.post("/import", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(pin_to_primary)])
+async def import_leads(
+    file: UploadFile = File(...),
+    lead_magnet_id: Optional[int] = Form(None)
+):
+    """
+    Import leads from a CSV file with a name,email[,lead_magnet_id] header.
+    lead_magnet_id applies to every row when the file has no such column.
+    Rows are loaded with COPY and merged in the background; invalid or
+    malformed rows and emails already registered are skipped and reported by
+    /import/{job_id}, where "row" is the 1-based data row of the file.
+    """
+    # keep our own copy, the upload is closed once this request ends
+    with tempfile.NamedTemporaryFile(prefix="lead-import-", suffix=".csv", delete=False) as f:
+        await run_in_threadpool(shutil.copyfileobj, file.file, f)
     try:
-        # Create the lead
-        new_lead = crud.create_lead(db=db, lead=lead)
-        
-        # Send welcome email in background if requested
-        if send_welcome and lead_magnet.content:
-            background_tasks.add_task(
-                send_welcome_email_task,
-                new_lead,
-                lead_magnet,
-                db
-            )
-        
-        return new_lead
-        
-    except Exception as e:
-        logger.error(f"Error creating lead: {str(e)}")
+        job = await lead_importer.submit(f.name, file.filename, lead_magnet_id)
+    except LeadImportError as e:
+        os.remove(f.name)
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create lead: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
+    return job.to_dict()
+
+@router.get("/import/{job_id}")
+async def get_import_status(job_id: str):
+    """Progress, counts and row errors of a CSV import"""
+    job = lead_importer.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Import job {job_id} not found"
+        )
+    return job.to_dict()
 
 @router.get("/", response_model=List[schemas.Lead])
 async def get_leads(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Depends(cursor_query),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all leads"""
-    return crud.get_leads(db=db, skip=skip, limit=limit)
+    """
+    Get all leads, oldest first.
+    Pass the X-Next-Cursor response header as `cursor` to get the next page.
+    created_from / created_to keep the leads created in [from, to); only the
+    monthly partitions of that range are read.
+    """
+    leads = await crud.get_leads(
+        db=db,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+        created_from=created_from,
+        created_to=created_to
+    )
+    return set_next_cursor(response, leads, limit)
 
 @router.get("/{lead_id}", response_model=schemas.Lead)
 async def get_lead(
     lead_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific lead by ID"""
-    lead = crud.get_lead(db=db, lead_id=lead_id)
+    lead = await crud.get_lead(db=db, lead_id=lead_id)
     if not lead:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -92,26 +207,34 @@ async def get_lead(
 @router.get("/by-lead-magnet/{lead_magnet_id}", response_model=List[schemas.Lead])
 async def get_leads_by_lead_magnet(
     lead_magnet_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Depends(cursor_query),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get all leads for a specific lead magnet"""
-    return crud.get_leads_by_lead_magnet(
+    """Get all leads for a specific lead magnet, paginated and filtered like GET /leads"""
+    leads = await crud.get_leads_by_lead_magnet(
         db=db,
         lead_magnet_id=lead_magnet_id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        cursor=cursor,
+        created_from=created_from,
+        created_to=created_to
     )
+    return set_next_cursor(response, leads, limit)
 
 @router.put("/{lead_id}", response_model=schemas.Lead)
 async def update_lead(
     lead_id: int,
     lead_update: schemas.LeadCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a lead"""
-    lead = crud.update_lead(db=db, lead_id=lead_id, lead_update=lead_update)
+    lead = await crud.update_lead(db=db, lead_id=lead_id, lead_update=lead_update)
     if not lead:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,10 +245,10 @@ async def update_lead(
 @router.delete("/{lead_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_lead(
     lead_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a lead"""
-    success = crud.delete_lead(db=db, lead_id=lead_id)
+    success = await crud.delete_lead(db=db, lead_id=lead_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -138,11 +261,11 @@ async def delete_lead(
 @router.post("/{lead_id}/send-welcome-email")
 async def send_welcome_email(
     lead_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Manually send welcome email to a lead"""
     # Get the lead
-    lead = crud.get_lead(db=db, lead_id=lead_id)
+    lead = await crud.get_lead(db=db, lead_id=lead_id)
     if not lead:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -150,7 +273,7 @@ async def send_welcome_email(
         )
     
     # Get the lead magnet
-    lead_magnet = crud.get_lead_magnet(db=db, lead_magnet_id=lead.lead_magnet_id)
+    lead_magnet = await crud.get_lead_magnet(db=db, lead_magnet_id=lead.lead_magnet_id)
     if not lead_magnet:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -172,7 +295,9 @@ async def send_welcome_email(
             "value_promise": lead_magnet.value_promise,
             "content": lead_magnet.content
         }
-        asset_buffer = asset_service.generate_asset(lead_magnet_dict)
+        attachment_part = email_service.get_lead_magnet_attachment(
+            lead_magnet_dict, asset_service.generate_asset
+        )
         
         # Send email
         lead_dict = {
@@ -184,7 +309,7 @@ async def send_welcome_email(
         success = email_service.send_welcome_email(
             lead=lead_dict,
             lead_magnet=lead_magnet_dict,
-            asset_bytes=asset_buffer.read()
+            attachment_part=attachment_part
         )
         
         if success:
@@ -201,36 +326,3 @@ async def send_welcome_email(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to send email: {str(e)}"
         )
-
-# ==================== BACKGROUND TASKS ====================
-
-def send_welcome_email_task(lead, lead_magnet, db: Session):
-    """Background task to send welcome email"""
-    try:
-        # Generate asset
-        lead_magnet_dict = {
-            "id": lead_magnet.id,
-            "title": lead_magnet.title,
-            "type": lead_magnet.type.value,
-            "value_promise": lead_magnet.value_promise,
-            "content": lead_magnet.content
-        }
-        asset_buffer = asset_service.generate_asset(lead_magnet_dict)
-        
-        # Send email
-        lead_dict = {
-            "id": lead.id,
-            "name": lead.name,
-            "email": lead.email
-        }
-        
-        email_service.send_welcome_email(
-            lead=lead_dict,
-            lead_magnet=lead_magnet_dict,
-            asset_bytes=asset_buffer.read()
-        )
-        
-        logger.info(f"Welcome email sent to {lead.email}")
-        
-    except Exception as e:
-        logger.error(f"Failed to send welcome email: {str(e)}")
\ No newline at end of file
@@ -11,6 +11,10 @@ class LeadMagnetCreate(LeadMagnetBase):
     pass
 class LeadMagnetContentUpdate(BaseModel):
     content: dict
+class LeadMagnetContentChange(BaseModel):
+    # keys / array indexes down to the value, e.g. ["steps", "0", "title"]
+    path: List[str]
+    value: Any
 class LeadMagnet(LeadMagnetBase):
     id: int
     created_at: datetime
@@ -65,3 +69,28 @@ class UpgradeOffer(UpgradeOfferBase):
     created_at: datetime
     class Config:
         from_attributes = True     
+class LeadMagnetFunnel(LeadMagnet):
+    landing_pages: List[LandingPage] = []
+    email_templates: List[EmailTemplate] = []
+    upgrade_offers: List[UpgradeOffer] = []
+    leads_count: int = 0
+class LeadMagnetStatsBucket(BaseModel):
+    bucket: datetime
+    leads: int
+    emails_sent: int
+    views: int
+class LeadMagnetStats(BaseModel):
+    lead_magnet_id: int
+    granularity: str
+    leads: int
+    emails_sent: int
+    views: int
+    buckets: List[LeadMagnetStatsBucket] = []
+class LeadMagnetRank(BaseModel):
+    lead_magnet_id: int
+    title: str
+    type: str
+    views: int
+    leads: int
+    # leads per landing page view within the ranking window
+    conversion_rate: float
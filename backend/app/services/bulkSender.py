@@ -0,0 +1,255 @@
+import asyncio
+import time
+import uuid
+import logging
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Callable, Hashable
+from config import (
+    SMTP_BULK_CONCURRENCY,
+    SMTP_DEFAULT_RATE_LIMIT,
+    SMTP_RATE_LIMITS,
+    SMTP_DEFAULT_DOMAIN_RATE_LIMIT,
+    SMTP_DOMAIN_RATE_LIMITS,
+    SMTP_MAX_RECIPIENTS_PER_MESSAGE,
+)
+from services.emails import EmailService
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, tokens: float = 1):
+        """
+        Wait until `tokens` are available and take them. Requests larger than
+        the capacity wait for a full bucket and leave it in debt, so the long
+        run rate still holds.
+        """
+        if self.rate <= 0:
+            return
+        needed = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """One token bucket per key (SMTP provider host)"""
+
+    def __init__(self, limits: Dict[str, float], default_rate: float):
+        self.limits = limits
+        self.default_rate = default_rate
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, key: str) -> TokenBucket:
+        key = key.lower()
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(self.limits.get(key, self.default_rate))
+        return self._buckets[key]
+
+    async def acquire(self, key: str, tokens: float = 1):
+        await self.bucket(key).acquire(tokens)
+
+
+def email_domain(email: Optional[str]) -> str:
+    """Lowercased domain part of an email address"""
+    if not email or "@" not in email:
+        return ""
+    return email.rsplit("@", 1)[1].strip().lower()
+
+
+def plan_domain_batches(
+    items: Iterable[Any],
+    email_of: Callable[[Any], str],
+    share_key: Callable[[Any], Optional[Hashable]],
+    max_recipients: int = SMTP_MAX_RECIPIENTS_PER_MESSAGE,
+    window: int = 1000
+) -> Iterator[List[Any]]:
+    """
+    Group items by recipient domain into send batches. A batch holds several
+    items only when they share a (non None) share_key, i.e. their message
+    content is identical, so it can go out as one transaction with several
+    RCPT TO. Batches are interleaved round robin across domains so one
+    throttled domain doesn't hold up the others. Items are planned `window`
+    at a time to keep memory bounded on long streams.
+    """
+    item_iter = iter(items)
+    while True:
+        chunk = list(islice(item_iter, window))
+        if not chunk:
+            return
+        per_domain: "OrderedDict[str, OrderedDict]" = OrderedDict()
+        for index, item in enumerate(chunk):
+            groups = per_domain.setdefault(email_domain(email_of(item)), OrderedDict())
+            key = share_key(item)
+            # unshareable items get a group of their own
+            groups.setdefault(("shared", key) if key is not None else ("single", index), []).append(item)
+        queues = deque()
+        for groups in per_domain.values():
+            batches = deque()
+            for group in groups.values():
+                for start in range(0, len(group), max_recipients):
+                    batches.append(group[start:start + max_recipients])
+            queues.append(batches)
+        while queues:
+            batches = queues.popleft()
+            yield batches.popleft()
+            if batches:
+                queues.append(batches)
+
+
+class BulkSendJob:
+    """Progress of one bulk send"""
+
+    def __init__(self, total: Optional[int] = None, description: str = ""):
+        self.id = uuid.uuid4().hex
+        self.description = description
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at:
+            end = self.finished_at or datetime.now(timezone.utc)
+            elapsed = (end - self.started_at).total_seconds()
+        return {
+            "job_id": self.id,
+            "description": self.description,
+            "status": self.status,
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "progress": round(self.processed / self.total, 4) if self.total else None,
+            "messages_per_second": round(self.processed / elapsed, 2) if elapsed else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class AsyncBulkSender:
+    """
+    Runs many email sends concurrently on the background worker loop.
+    `concurrency` sends run at once (each on a pooled SMTP connection, in a
+    thread since smtplib is blocking). Every send first takes a token from the
+    bucket of its SMTP provider and, when a domain is given, one token per
+    recipient from the bucket of the recipient domain.
+    """
+
+    def __init__(
+        self,
+        email_service: EmailService,
+        concurrency: int = SMTP_BULK_CONCURRENCY,
+        rate_limiter: Optional[RateLimiter] = None,
+        domain_limiter: Optional[RateLimiter] = None
+    ):
+        self.email_service = email_service
+        self.concurrency = concurrency
+        self.rate_limiter = rate_limiter or RateLimiter(SMTP_RATE_LIMITS, SMTP_DEFAULT_RATE_LIMIT)
+        self.domain_limiter = domain_limiter or RateLimiter(SMTP_DOMAIN_RATE_LIMITS, SMTP_DEFAULT_DOMAIN_RATE_LIMIT)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="smtp-send")
+
+    @property
+    def provider(self) -> str:
+        return self.email_service.pool.host or "default"
+
+    async def _send_one(
+        self,
+        send: Callable[[Any], bool],
+        item: Any,
+        domain: Optional[str] = None,
+        recipients: int = 1
+    ) -> bool:
+        await self.rate_limiter.acquire(self.provider)
+        if domain:
+            await self.domain_limiter.acquire(domain, recipients)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, send, item)
+
+    async def run(
+        self,
+        items: Iterable[Any],
+        send: Callable[[Any], bool],
+        job: Optional[BulkSendJob] = None,
+        on_result: Optional[Callable[[Any, bool], None]] = None,
+        domain_of: Optional[Callable[[Any], str]] = None,
+        recipients_of: Optional[Callable[[Any], int]] = None
+    ) -> BulkSendJob:
+        """
+        Call send(item) for every item with bounded concurrency, send returns success.
+        domain_of/recipients_of enable per domain throttling (and job counts) for
+        items that address several recipients.
+        """
+        job = job or BulkSendJob()
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        # workers pull from one shared iterator so items are never all scheduled at once
+        item_iter = iter(items)
+        report_every = max(100, (job.total or 1000) // 10)
+        next_report = report_every
+
+        async def consume():
+            nonlocal next_report
+            for item in item_iter:
+                recipients = recipients_of(item) if recipients_of else 1
+                try:
+                    success = await self._send_one(
+                        send, item, domain_of(item) if domain_of else None, recipients
+                    )
+                except Exception as e:
+                    logger.error(f"Bulk send failed: {str(e)}")
+                    success = False
+                if success:
+                    job.sent += recipients
+                else:
+                    job.failed += recipients
+                if on_result:
+                    on_result(item, success)
+                if job.processed >= next_report:
+                    next_report += report_every
+                    logger.info(f"Bulk job {job.id}: {job.processed}/{job.total or '?'} processed")
+
+        try:
+            await asyncio.gather(*(consume() for _ in range(self.concurrency)))
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Bulk job {job.id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+        return job
+
+    def close(self):
+        self._executor.shutdown(wait=False)
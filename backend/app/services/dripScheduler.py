@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import crud
+import statements
+from database import SessionLocal
+from models import Lead, EmailTemplate, LeadSequence, SequenceStatusEnum
+from config import DRIP_DELAY_HOURS, DRIP_SWEEP_INTERVAL, DRIP_BATCH_SIZE
+from services.worker import BackgroundWorker, background_worker
+
+logger = logging.getLogger(__name__)
+
+
+class DripScheduler:
+    """
+    Sends nurture sequences one email at a time.
+    Per-lead state lives in lead_sequences; instead of a timer per lead, each
+    sweep reads the due rows through the partial index on next_send_at, queues
+    the due email of every sequence in the outbox and moves the sequence to its
+    next email (DRIP_DELAY_HOURS later) in the same transaction.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        delay: timedelta = timedelta(hours=DRIP_DELAY_HOURS),
+        sweep_interval: float = DRIP_SWEEP_INTERVAL,
+        batch_size: int = DRIP_BATCH_SIZE
+    ):
+        self.session_factory = session_factory
+        self.delay = delay
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+        self._future: Optional[Future] = None
+
+    def start(self, worker: BackgroundWorker = background_worker):
+        if self._future and not self._future.done():
+            return
+        self._future = worker.submit(self.run())
+
+    def stop(self):
+        if self._future:
+            self._future.cancel()
+            self._future = None
+
+    async def run(self):
+        """Sweep forever; full batches are followed by another sweep right away"""
+        logger.info("Drip scheduler started")
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                processed = await loop.run_in_executor(None, self.sweep_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Drip sweep failed: {str(e)}")
+                processed = 0
+            if processed < self.batch_size:
+                await asyncio.sleep(self.sweep_interval)
+
+    def advance(self, sequence: LeadSequence, templates: List[EmailTemplate], now: datetime) -> Optional[EmailTemplate]:
+        """
+        Move sequence past its due template and return that template (None if
+        the sequence has run out). templates are the lead magnet's templates in
+        (sequence_number, id) order, the position indexes them.
+        """
+        position = sequence.next_position
+        template = templates[position] if position < len(templates) else None
+        position += 1
+        if position < len(templates):
+            sequence.next_position = position
+            sequence.next_sequence_number = templates[position].sequence_number
+            sequence.next_send_at = now + self.delay
+        else:
+            sequence.status = SequenceStatusEnum.completed
+            sequence.next_send_at = None
+        return template
+
+    def sweep_once(self) -> int:
+        """Advance one batch of due sequences; returns how many were processed"""
+        db = self.session_factory()
+        try:
+            sequences = crud.claim_due_sequences(db, limit=self.batch_size)
+            if not sequences:
+                db.commit()
+                return 0
+
+            # one query for the leads and one for the templates of the whole batch
+            leads = {
+                lead.id: lead
+                for lead in db.query(Lead).filter(Lead.id.in_({s.lead_id for s in sequences}))
+            }
+            templates: Dict[int, List[EmailTemplate]] = defaultdict(list)
+            for template in (
+                db.query(EmailTemplate)
+                .filter(EmailTemplate.lead_magnet_id.in_({s.lead_magnet_id for s in sequences}))
+                .order_by(EmailTemplate.sequence_number, EmailTemplate.id)
+            ):
+                templates[template.lead_magnet_id].append(template)
+
+            now = datetime.now(timezone.utc)
+            outbox_rows = []
+            for sequence in sequences:
+                lead = leads.get(sequence.lead_id)
+                if lead is None:
+                    sequence.status = SequenceStatusEnum.cancelled
+                    sequence.next_send_at = None
+                    continue
+                template = self.advance(sequence, templates.get(sequence.lead_magnet_id, []), now)
+                if template is not None:
+                    outbox_rows.append(statements.nurture_outbox_row(template, lead))
+
+            crud.enqueue_outbox_rows(db, outbox_rows)
+            db.commit()
+            logger.info(f"Drip sweep: {len(sequences)} sequences, {len(outbox_rows)} emails queued")
+            return len(sequences)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+drip_scheduler = DripScheduler()
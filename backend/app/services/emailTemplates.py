@@ -0,0 +1,152 @@
+import html
+import re
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List
+
+# {{field}} or {field}; only names a template declares are treated as slots,
+# anything else in braces (e.g. "{Your Name}" style LLM placeholders) stays literal
+PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}|\{(\w+)\}")
+
+
+class CompiledTemplate:
+    """
+    Template split once into static segments and placeholder slots.
+    Rendering is a single join of the static segments with the (escaped) values.
+    """
+
+    def __init__(self, source: str, fields: Iterable[str], escape: bool = True):
+        fields = set(fields)
+        self.escape = escape
+        self._static: List[str] = []
+        self._slots: List[str] = []
+        pos = 0
+        for match in PLACEHOLDER.finditer(source):
+            field = match.group(1) or match.group(2)
+            if field not in fields:
+                continue
+            self._static.append(source[pos:match.start()])
+            self._slots.append(field)
+            pos = match.end()
+        self._static.append(source[pos:])
+
+    @property
+    def is_static(self) -> bool:
+        """True when the template has no slots, i.e. renders the same for everyone"""
+        return not self._slots
+
+    def render(self, values: Dict[str, Any]) -> str:
+        """Fill the slots; values are HTML escaped when the template was compiled with escape"""
+        parts = [self._static[0]]
+        for field, static in zip(self._slots, self._static[1:]):
+            value = str(values.get(field, ""))
+            parts.append(html.escape(value) if self.escape else value)
+            parts.append(static)
+        return "".join(parts)
+
+
+WELCOME_SUBJECT = CompiledTemplate("Your Free {title} is Here! 🎉", ["title"], escape=False)
+
+WELCOME_BODY = CompiledTemplate("""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #6366f1;">Hi {name}! 👋</h1>
+                
+                <p>Thanks for downloading <strong>{title}</strong>!</p>
+                
+                <p>{value_promise}</p>
+                
+                <div style="background: #f3f4f6; padding: 20px; border-radius: 10px; margin: 20px 0;">
+                    <h2 style="color: #4f46e5; margin-top: 0;">What's Next?</h2>
+                    <ul>
+                        <li>Download your resource attached to this email</li>
+                        <li>Review the content and start implementing</li>
+                        <li>Watch for follow-up emails with additional tips</li>
+                    </ul>
+                </div>
+                
+                <p>If you have any questions, just reply to this email. I'm here to help!</p>
+                
+                <p style="margin-top: 30px;">
+                    Best regards,<br>
+                    <strong>Your Team</strong>
+                </p>
+                
+                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
+                
+                <p style="font-size: 12px; color: #6b7280;">
+                    You're receiving this email because you downloaded {footer_title} from our website.
+                </p>
+            </div>
+        </body>
+        </html>
+        """, ["name", "title", "value_promise", "footer_title"])
+
+NURTURE_HEADER = """
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                """
+
+NURTURE_FOOTER = """
+                
+                <p style="margin-top: 30px;">
+                    Best regards,<br>
+                    <strong>Your Team</strong>
+                </p>
+                
+                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
+                
+                <p style="font-size: 12px; color: #6b7280;">
+                    You're receiving this email as part of our nurture sequence.
+                    <a href="#" style="color: #6366f1;">Unsubscribe</a>
+                </p>
+            </div>
+        </body>
+        </html>
+        """
+
+UPGRADE_OFFER_SUBJECT = CompiledTemplate("Special Offer: {title}", ["title"], escape=False)
+
+UPGRADE_OFFER_BODY = CompiledTemplate("""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #6366f1;">Hi {name}! 🚀</h1>
+                
+                <p>I hope you've been enjoying the resource you downloaded!</p>
+                
+                <h2 style="color: #4f46e5;">{title}</h2>
+                
+                <p>{description}</p>
+                
+                <div style="text-align: center; margin: 30px 0;">
+                    <a href="{link}" 
+                       style="display: inline-block; background: #6366f1; color: white; 
+                              padding: 15px 30px; text-decoration: none; border-radius: 5px;
+                              font-weight: bold;">
+                        Learn More →
+                    </a>
+                </div>
+                
+                <p>Have questions? Just reply to this email!</p>
+                
+                <p style="margin-top: 30px;">
+                    Best regards,<br>
+                    <strong>Your Team</strong>
+                </p>
+            </div>
+        </body>
+        </html>
+        """, ["name", "title", "description", "link"])
+
+
+@lru_cache(maxsize=256)
+def compile_nurture_body(body_template: str) -> CompiledTemplate:
+    """
+    Compile a nurture email template (as stored in email_templates.body) wrapped
+    in the nurture HTML shell. Newlines become <br> once, at compile time; the
+    template body itself is trusted HTML, only {name}/{{name}} is filled per lead.
+    """
+    body = body_template.replace("\n", "<br>")
+    return CompiledTemplate(NURTURE_HEADER + body + NURTURE_FOOTER, ["name"])
@@ -1,44 +1,142 @@
-import smtplib
+import hashlib
+import json
 import logging
+import threading
+from collections import OrderedDict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import Dict, Any, List, Optional
-from config import SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, FROM_EMAIL
+from io import BytesIO
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from config import SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, FROM_EMAIL, EMAIL_ATTACHMENT_CACHE_SIZE
+from services.smtpPool import SMTPConnectionPool, get_smtp_pool
+from services.emailTemplates import (
+    WELCOME_SUBJECT,
+    WELCOME_BODY,
+    UPGRADE_OFFER_SUBJECT,
+    UPGRADE_OFFER_BODY,
+    compile_nurture_body,
+)
 
 logger = logging.getLogger(__name__)
 
+
+def asset_version(lead_magnet: Dict[str, Any]) -> str:
+    """Fingerprint of everything the rendered asset depends on"""
+    if lead_magnet.get('asset_version'):
+        return lead_magnet['asset_version']
+    fingerprint = json.dumps(
+        [lead_magnet.get(key) for key in ('title', 'type', 'value_promise', 'content')],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+
+class AttachmentCache:
+    """
+    LRU cache of encoded MIME attachment parts keyed by (lead magnet id, asset version).
+    A campaign sending the same asset to thousands of leads renders and
+    base64-encodes it once; concurrent misses on one key build it only once.
+    """
+
+    def __init__(self, max_entries: int = EMAIL_ATTACHMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._parts: "OrderedDict[Tuple[Any, str], MIMEBase]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple[Any, str], threading.Lock] = {}
+
+    def get_or_build(self, key: Tuple[Any, str], build: Callable[[], MIMEBase]) -> MIMEBase:
+        with self._lock:
+            part = self._parts.get(key)
+            if part is not None:
+                self._parts.move_to_end(key)
+                return part
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                part = self._parts.get(key)
+            if part is None:
+                part = build()
+                with self._lock:
+                    self._parts[key] = part
+                    while len(self._parts) > self.max_entries:
+                        self._parts.popitem(last=False)
+            with self._lock:
+                self._key_locks.pop(key, None)
+            return part
+
+    def clear(self):
+        with self._lock:
+            self._parts.clear()
+
 class EmailService:
     """Service for sending emails via SMTP"""
     
-    def __init__(self):
+    def __init__(self, pool: Optional[SMTPConnectionPool] = None):
         self.smtp_server = SMTP_SERVER
         self.smtp_port = SMTP_PORT
         self.username = SMTP_USERNAME
         self.password = SMTP_PASSWORD
         self.from_email = FROM_EMAIL
+        self._pool = pool
+        self.attachments = AttachmentCache()
+
+    @property
+    def pool(self) -> SMTPConnectionPool:
+        """Pooled SMTP transport, connections are reused across messages"""
+        if self._pool is None:
+            return get_smtp_pool()
+        return self._pool
     
-    def _create_smtp_connection(self):
-        """Create and return SMTP connection"""
-        try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.username, self.password)
-            return server
-        except Exception as e:
-            logger.error(f"Failed to connect to SMTP server: {str(e)}")
-            raise
-    
+    def build_attachment(self, data: bytes, filename: str) -> MIMEBase:
+        """Build a base64 encoded attachment part (safe to attach to many messages)"""
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(data)
+        encoders.encode_base64(part)
+        part.add_header(
+            'Content-Disposition',
+            f'attachment; filename= {filename}'
+        )
+        return part
+
+    def attachment_filename(self, lead_magnet: Dict[str, Any]) -> str:
+        """Filename of the lead magnet asset"""
+        lead_type = lead_magnet.get('type', 'resource')
+        filename = f"{lead_magnet.get('title', 'resource').replace(' ', '_')}.pdf"
+        if lead_type == 'calculator':
+            filename = filename.replace('.pdf', '.html')
+        return filename
+
+    def get_lead_magnet_attachment(
+        self,
+        lead_magnet: Dict[str, Any],
+        render: Callable[[Dict[str, Any]], BytesIO]
+    ) -> MIMEBase:
+        """
+        Encoded asset attachment of a lead magnet, rendered with `render` only
+        the first time a given (lead magnet, asset version) is requested
+        """
+        key = (lead_magnet.get('id'), asset_version(lead_magnet))
+        return self.attachments.get_or_build(
+            key,
+            lambda: self.build_attachment(
+                render(lead_magnet).read(),
+                self.attachment_filename(lead_magnet)
+            )
+        )
+
     def send_email(
         self,
         to_email: str,
         subject: str,
         body: str,
         attachment: Optional[bytes] = None,
-        attachment_filename: Optional[str] = None
+        attachment_filename: Optional[str] = None,
+        attachment_part: Optional[MIMEBase] = None
     ) -> bool:
-        """Send a single email"""
+        """Send a single email, attachment_part is a prebuilt (shared) attachment"""
         try:
             msg = MIMEMultipart()
             msg['From'] = self.from_email
@@ -49,20 +147,13 @@ class EmailService:
             msg.attach(MIMEText(body, 'html'))
             
             # Add attachment if provided
-            if attachment and attachment_filename:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment)
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {attachment_filename}'
-                )
-                msg.attach(part)
+            if attachment_part is not None:
+                msg.attach(attachment_part)
+            elif attachment and attachment_filename:
+                msg.attach(self.build_attachment(attachment, attachment_filename))
             
-            # Send email
-            server = self._create_smtp_connection()
-            server.send_message(msg)
-            server.quit()
+            # Send email on a pooled (already authenticated) connection
+            self.pool.send_message(msg)
             
             logger.info(f"Email sent successfully to {to_email}")
             return True
@@ -71,63 +162,56 @@ class EmailService:
             logger.error(f"Failed to send email to {to_email}: {str(e)}")
             return False
     
+    def send_email_to_many(
+        self,
+        to_emails: List[str],
+        subject: str,
+        body: str
+    ) -> List[str]:
+        """
+        Send one identical message to several recipients in a single SMTP
+        transaction (one MAIL FROM, one RCPT TO per recipient, one DATA).
+        Returns the recipients that were refused.
+        """
+        try:
+            msg = MIMEMultipart()
+            msg['From'] = self.from_email
+            msg['To'] = 'undisclosed-recipients:;'
+            msg['Subject'] = subject
+            msg.attach(MIMEText(body, 'html'))
+            
+            refused = self.pool.send_message(msg, to_addrs=to_emails)
+            
+            logger.info(f"Email sent successfully to {len(to_emails) - len(refused)} recipients in one transaction")
+            return list(refused)
+            
+        except Exception as e:
+            logger.error(f"Failed to send email to {len(to_emails)} recipients: {str(e)}")
+            return list(to_emails)
+    
     def send_welcome_email(
         self,
         lead: Dict[str, Any],
         lead_magnet: Dict[str, Any],
-        asset_bytes: Optional[bytes] = None
+        asset_bytes: Optional[bytes] = None,
+        attachment_part: Optional[MIMEBase] = None
     ) -> bool:
-        """Send welcome email with lead magnet"""
-        subject = f"Your Free {lead_magnet.get('title', 'Resource')} is Here! 🎉"
-        
-        body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h1 style="color: #6366f1;">Hi {lead.get('name', 'there')}! 👋</h1>
-                
-                <p>Thanks for downloading <strong>{lead_magnet.get('title', 'your resource')}</strong>!</p>
-                
-                <p>{lead_magnet.get('value_promise', 'This resource will help you achieve great results.')}</p>
-                
-                <div style="background: #f3f4f6; padding: 20px; border-radius: 10px; margin: 20px 0;">
-                    <h2 style="color: #4f46e5; margin-top: 0;">What's Next?</h2>
-                    <ul>
-                        <li>Download your resource attached to this email</li>
-                        <li>Review the content and start implementing</li>
-                        <li>Watch for follow-up emails with additional tips</li>
-                    </ul>
-                </div>
-                
-                <p>If you have any questions, just reply to this email. I'm here to help!</p>
-                
-                <p style="margin-top: 30px;">
-                    Best regards,<br>
-                    <strong>Your Team</strong>
-                </p>
-                
-                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
-                
-                <p style="font-size: 12px; color: #6b7280;">
-                    You're receiving this email because you downloaded {lead_magnet.get('title', 'a resource')} from our website.
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Determine filename
-        lead_type = lead_magnet.get('type', 'resource')
-        filename = f"{lead_magnet.get('title', 'resource').replace(' ', '_')}.pdf"
-        if lead_type == 'calculator':
-            filename = filename.replace('.pdf', '.html')
+        """Send welcome email with lead magnet (asset_bytes or a prebuilt attachment_part)"""
+        subject = WELCOME_SUBJECT.render({"title": lead_magnet.get('title', 'Resource')})
+        body = WELCOME_BODY.render({
+            "name": lead.get('name', 'there'),
+            "title": lead_magnet.get('title', 'your resource'),
+            "value_promise": lead_magnet.get('value_promise', 'This resource will help you achieve great results.'),
+            "footer_title": lead_magnet.get('title', 'a resource'),
+        })
         
         return self.send_email(
             to_email=lead.get('email'),
             subject=subject,
             body=body,
             attachment=asset_bytes,
-            attachment_filename=filename
+            attachment_filename=self.attachment_filename(lead_magnet),
+            attachment_part=attachment_part
         )
     
     def send_nurture_email(
@@ -137,34 +221,10 @@ class EmailService:
     ) -> bool:
         """Send a nurture sequence email"""
         subject = email_template.get('subject', 'Quick tip for you')
-        body_template = email_template.get('body', '')
-        
-        # Replace placeholders
-        body = body_template.replace('{name}', lead.get('name', 'there'))
-        body = body.replace('{{name}}', lead.get('name', 'there'))
-        
-        # Wrap in HTML template
-        html_body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                {body.replace(chr(10), '<br>')}
-                
-                <p style="margin-top: 30px;">
-                    Best regards,<br>
-                    <strong>Your Team</strong>
-                </p>
-                
-                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
-                
-                <p style="font-size: 12px; color: #6b7280;">
-                    You're receiving this email as part of our nurture sequence.
-                    <a href="#" style="color: #6366f1;">Unsubscribe</a>
-                </p>
-            </div>
-        </body>
-        </html>
-        """
+        # compiled once per distinct template body, rendering is a join
+        html_body = compile_nurture_body(email_template.get('body', '')).render(
+            {"name": lead.get('name', 'there')}
+        )
         
         return self.send_email(
             to_email=lead.get('email'),
@@ -172,45 +232,44 @@ class EmailService:
             body=html_body
         )
     
+    def is_personalized(self, email_template: Dict[str, Any]) -> bool:
+        """Whether a nurture template renders differently per lead"""
+        return not compile_nurture_body(email_template.get('body', '')).is_static
+    
+    def send_nurture_email_batch(
+        self,
+        leads: List[Dict[str, Any]],
+        email_template: Dict[str, Any]
+    ) -> List[str]:
+        """
+        Send a nurture email to several leads, as one transaction when the
+        template is not personalized. Returns the emails that failed.
+        """
+        if len(leads) == 1 or self.is_personalized(email_template):
+            return [
+                lead.get('email') for lead in leads
+                if not self.send_nurture_email(lead, email_template)
+            ]
+        html_body = compile_nurture_body(email_template.get('body', '')).render({})
+        return self.send_email_to_many(
+            to_emails=[lead.get('email') for lead in leads],
+            subject=email_template.get('subject', 'Quick tip for you'),
+            body=html_body
+        )
+    
     def send_upgrade_offer_email(
         self,
         lead: Dict[str, Any],
         upgrade_offer: Dict[str, Any]
     ) -> bool:
         """Send upgrade offer email"""
-        subject = f"Special Offer: {upgrade_offer.get('title', 'Upgrade Available')}"
-        
-        body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h1 style="color: #6366f1;">Hi {lead.get('name', 'there')}! 🚀</h1>
-                
-                <p>I hope you've been enjoying the resource you downloaded!</p>
-                
-                <h2 style="color: #4f46e5;">{upgrade_offer.get('title', 'Special Offer')}</h2>
-                
-                <p>{upgrade_offer.get('description', 'Take your results to the next level with this special offer.')}</p>
-                
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{upgrade_offer.get('link', '#')}" 
-                       style="display: inline-block; background: #6366f1; color: white; 
-                              padding: 15px 30px; text-decoration: none; border-radius: 5px;
-                              font-weight: bold;">
-                        Learn More →
-                    </a>
-                </div>
-                
-                <p>Have questions? Just reply to this email!</p>
-                
-                <p style="margin-top: 30px;">
-                    Best regards,<br>
-                    <strong>Your Team</strong>
-                </p>
-            </div>
-        </body>
-        </html>
-        """
+        subject = UPGRADE_OFFER_SUBJECT.render({"title": upgrade_offer.get('title', 'Upgrade Available')})
+        body = UPGRADE_OFFER_BODY.render({
+            "name": lead.get('name', 'there'),
+            "title": upgrade_offer.get('title', 'Special Offer'),
+            "description": upgrade_offer.get('description', 'Take your results to the next level with this special offer.'),
+            "link": upgrade_offer.get('link', '#'),
+        })
         
         return self.send_email(
             to_email=lead.get('email'),
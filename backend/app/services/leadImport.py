@@ -0,0 +1,288 @@
+import asyncio
+import csv
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from itertools import islice
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import text
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+IMPORT_COLUMNS = ("name", "email", "lead_magnet_id")
+# rows parsed per executor call
+PARSE_BATCH_SIZE = 10000
+# row level errors returned in the job status, the counts cover all of them
+MAX_REPORTED_ERRORS = 100
+# finished jobs kept for the status endpoint
+MAX_KEPT_JOBS = 100
+
+# staging rows keep the raw text so a bad value is reported instead of failing COPY;
+# rows the CSV parser rejected only carry their error
+CREATE_STAGING = """
+CREATE TEMP TABLE lead_import_staging (
+    row_number bigint,
+    name text,
+    email text,
+    lead_magnet_id text,
+    error text
+) ON COMMIT DROP
+"""
+STAGING_COLUMNS = ["row_number", "name", "email", "lead_magnet_id", "error"]
+# one pass over the staging table: first error of each row, NULL when it can be imported
+CREATE_CHECKED = """
+CREATE TEMP TABLE lead_import_checked ON COMMIT DROP AS
+SELECT s.row_number, s.name, s.email, s.lead_magnet_id,
+    CASE
+        WHEN s.error IS NOT NULL THEN s.error
+        WHEN s.name IS NULL THEN 'missing name'
+        WHEN s.email IS NULL THEN 'missing email'
+        WHEN s.email !~ '^[^@\\s]+@[^@\\s]+\\.[^@\\s]+$' THEN 'invalid email'
+        WHEN s.lead_magnet_id IS NULL THEN 'invalid lead_magnet_id'
+        WHEN lm.id IS NULL THEN 'unknown lead_magnet_id'
+        WHEN s.occurrence > 1 THEN 'duplicate email in file'
+        WHEN l.email IS NOT NULL THEN 'email already registered'
+    END AS error
+FROM (
+    SELECT row_number, error,
+        nullif(btrim(name), '') AS name,
+        nullif(btrim(email), '') AS email,
+        CASE WHEN btrim(lead_magnet_id) ~ '^[0-9]{1,9}$' THEN btrim(lead_magnet_id)::integer END AS lead_magnet_id,
+        row_number() OVER (PARTITION BY nullif(btrim(email), '') ORDER BY row_number) AS occurrence
+    FROM lead_import_staging
+) s
+LEFT JOIN lead_magnet lm ON lm.id = s.lead_magnet_id
+LEFT JOIN lead_emails l ON l.email = s.email
+"""
+# claim the emails in the registry first (emails registered since the check are
+# skipped), insert the claimed leads with the ids and timestamps claimed and
+# count them in the lead magnet stats; returns the number of leads imported
+MERGE = """
+WITH claimed AS (
+    INSERT INTO lead_emails (email, lead_id, lead_magnet_id, created_at)
+    SELECT email, nextval('leads_id_seq'), lead_magnet_id, now() FROM lead_import_checked
+    WHERE error IS NULL
+    ORDER BY row_number
+    ON CONFLICT (email) DO NOTHING
+    RETURNING email, lead_id, lead_magnet_id, created_at
+), inserted AS (
+    INSERT INTO leads (id, name, email, lead_magnet_id, created_at)
+    SELECT c.lead_id, k.name, c.email, c.lead_magnet_id, c.created_at
+    FROM claimed c JOIN lead_import_checked k ON k.email = c.email AND k.error IS NULL
+    RETURNING lead_magnet_id, created_at
+), counted AS (
+    INSERT INTO lead_magnet_stats_deltas (lead_magnet_id, bucket, leads)
+    SELECT lead_magnet_id, date_trunc('hour', created_at, 'UTC'), count(*) FROM inserted
+    GROUP BY 1, 2
+    RETURNING leads
+)
+SELECT coalesce(sum(leads), 0) FROM counted
+"""
+ERROR_COUNTS = "SELECT error, count(*) FROM lead_import_checked WHERE error IS NOT NULL GROUP BY error"
+ERROR_SAMPLE = """
+SELECT row_number, email, error FROM lead_import_checked
+WHERE error IS NOT NULL ORDER BY row_number LIMIT :limit
+"""
+
+
+class LeadImportError(Exception):
+    pass
+
+
+def read_header(path: str) -> List[str]:
+    """Column names of the CSV file, validated against IMPORT_COLUMNS"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        header = next(csv.reader(f), None)
+    if not header:
+        raise LeadImportError("CSV file is empty")
+    columns = [column.strip().lower() for column in header]
+    unknown = [column for column in columns if column not in IMPORT_COLUMNS]
+    missing = [column for column in ("name", "email") if column not in columns]
+    if unknown or missing or len(set(columns)) != len(columns):
+        raise LeadImportError(
+            f"CSV header must contain name and email, optionally lead_magnet_id (got {', '.join(header)})"
+        )
+    return columns
+
+
+def _lines(f: BinaryIO, job: "LeadImportJob") -> Iterator[str]:
+    for line in f:
+        job.bytes_read += len(line)
+        yield line.decode("utf-8", errors="replace")
+
+
+def parse_rows(f: BinaryIO, columns: List[str], job: "LeadImportJob") -> Iterator[Tuple]:
+    """
+    Staging records (row_number, name, email, lead_magnet_id, error) of the
+    data rows of the CSV file f. A row the parser can't read (bad quoting,
+    wrong number of fields) becomes a record with only its error, so it is
+    reported like any other invalid row and the rest of the file still loads.
+    """
+    reader = csv.reader(_lines(f, job), strict=True)
+    next(reader, None)  # header, checked by read_header
+    default_lead_magnet_id = str(job.lead_magnet_id) if job.lead_magnet_id is not None else None
+    row_number = 0
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            row_number += 1
+            yield (row_number, None, None, None, f"malformed CSV: {e}")
+            continue
+        if not row:
+            continue
+        row_number += 1
+        if len(row) != len(columns):
+            yield (row_number, None, None, None, f"expected {len(columns)} fields, got {len(row)}")
+        elif any("\x00" in value for value in row):
+            yield (row_number, None, None, None, "malformed CSV: NUL character")
+        else:
+            values = dict(zip(columns, row))
+            yield (
+                row_number,
+                values["name"],
+                values["email"],
+                values.get("lead_magnet_id", default_lead_magnet_id),
+                None,
+            )
+
+
+class LeadImportJob:
+    """Progress of one CSV import"""
+
+    def __init__(self, filename: str, total_bytes: int, lead_magnet_id: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.lead_magnet_id = lead_magnet_id
+        self.total_bytes = total_bytes
+        self.bytes_read = 0
+        self.status = "queued"
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.error_counts: Dict[str, int] = {}
+        self.errors: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at:
+            end = self.finished_at or datetime.now(timezone.utc)
+            elapsed = (end - self.started_at).total_seconds()
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "progress": round(self.bytes_read / self.total_bytes, 4) if self.total_bytes else None,
+            "rows": self.rows,
+            "imported": self.imported,
+            "rejected": self.rejected,
+            "error_counts": self.error_counts,
+            "errors": self.errors,
+            "rows_per_second": round(self.rows / elapsed, 2) if elapsed and self.rows else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class LeadImporter:
+    """
+    Imports lead CSV files with COPY.
+    The file is parsed in a thread and streamed into a temporary staging
+    table with binary COPY, checked in one
+    set-based pass (missing fields, malformed emails, unknown lead magnets,
+    duplicates within the file and against existing leads) and the valid rows
+    are merged into leads with a single INSERT ... SELECT, all in one
+    transaction. Jobs run as tasks on the API event loop, whose async engine
+    they use.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.jobs: "OrderedDict[str, LeadImportJob]" = OrderedDict()
+        self._tasks = set()
+
+    def get_job(self, job_id: str) -> Optional[LeadImportJob]:
+        return self.jobs.get(job_id)
+
+    async def submit(self, path: str, filename: str, lead_magnet_id: Optional[int] = None) -> LeadImportJob:
+        """Start importing the CSV at path (deleted afterwards) and return its job"""
+        columns = await asyncio.to_thread(read_header, path)
+        if "lead_magnet_id" not in columns and lead_magnet_id is None:
+            raise LeadImportError("CSV has no lead_magnet_id column, pass lead_magnet_id for all rows")
+        total_bytes = await asyncio.to_thread(os.path.getsize, path)
+        job = LeadImportJob(filename, total_bytes, lead_magnet_id)
+        self.jobs[job.id] = job
+        while len(self.jobs) > MAX_KEPT_JOBS:
+            self.jobs.popitem(last=False)
+        task = asyncio.get_running_loop().create_task(self._run(job, path, columns))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: LeadImportJob, path: str, columns: List[str]):
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        try:
+            await self.import_file(job, path, columns)
+            job.status = "completed"
+        except Exception as e:
+            logger.error(f"Lead import {job.id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def import_file(self, job: LeadImportJob, path: str, columns: List[str]):
+        async with self.session_factory() as db:
+            await db.execute(text(CREATE_STAGING))
+            connection = await db.connection()
+            raw = await connection.get_raw_connection()
+            result = await raw.driver_connection.copy_records_to_table(
+                "lead_import_staging",
+                records=self._read_records(job, path, columns),
+                columns=STAGING_COLUMNS,
+            )
+            job.rows = int(result.split()[-1])
+            job.status = "validating"
+            await db.execute(text(CREATE_CHECKED))
+            job.status = "merging"
+            job.imported = (await db.execute(text(MERGE))).scalar()
+            job.error_counts = {error: count for error, count in (await db.execute(text(ERROR_COUNTS))).all()}
+            job.errors = [
+                {"row": row_number, "email": email, "error": error}
+                for row_number, email, error in (await db.execute(text(ERROR_SAMPLE), {"limit": MAX_REPORTED_ERRORS})).all()
+            ]
+            await db.commit()
+        job.rejected = job.rows - job.imported
+
+    async def _read_records(self, job: LeadImportJob, path: str, columns: List[str]):
+        """Staging records for COPY, read and parsed off the event loop"""
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            rows = parse_rows(f, columns, job)
+            while True:
+                batch = await asyncio.to_thread(list, islice(rows, PARSE_BATCH_SIZE))
+                if not batch:
+                    return
+                for record in batch:
+                    yield record
+        finally:
+            f.close()
+
+
+lead_importer = LeadImporter()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+import async_crud
+import schemas
+from database import AsyncSessionLocal
+from config import LEAD_INGEST_MAX_BATCH, LEAD_INGEST_MAX_DELAY_MS, LEAD_INGEST_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# (lead, send_welcome, future of the created lead)
+PendingLead = Tuple[schemas.LeadCreate, bool, asyncio.Future]
+
+
+class LeadIngestBuffer:
+    """
+    Group commit for lead capture.
+    Requests park their lead here and wait; a flusher on the API event loop
+    writes whatever accumulated (up to max_batch leads, waiting at most
+    max_delay for a batch to fill) with one multi-row insert and one commit,
+    then resolves every request of the batch. A request is only answered once
+    its lead is committed, so nothing acknowledged is lost on a crash.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        max_batch: int = LEAD_INGEST_MAX_BATCH,
+        max_delay: float = LEAD_INGEST_MAX_DELAY_MS / 1000,
+        concurrency: int = LEAD_INGEST_CONCURRENCY
+    ):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self._pending: List[PendingLead] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushes = set()
+        self.batches = 0
+        self.leads = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the flusher on the running (API) event loop"""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Write what is still buffered, then stop the flusher"""
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while self._pending:
+            await self._flush(self._take())
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def submit(self, lead: schemas.LeadCreate, send_welcome: bool = False):
+        """Create a lead through the next batch; same result and errors as async_crud.create_lead"""
+        if not self.running:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((lead, send_welcome, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_batch:
+            self._full.set()
+        return await future
+
+    def _take(self) -> List[PendingLead]:
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if len(self._pending) < self.max_batch:
+            self._full.clear()
+        if not self._pending:
+            self._wakeup.clear()
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # give the batch up to max_delay to fill; while earlier batches
+            # are being committed more leads pile up anyway
+            if len(self._pending) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            await self._slots.acquire()
+            batch = self._take()
+            if not batch:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._flush(batch, acquired=True))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: List[PendingLead], acquired: bool = False):
+        try:
+            try:
+                async with self.session_factory() as db:
+                    created = await async_crud.create_leads(db, [(lead, send_welcome) for lead, send_welcome, _ in batch])
+            except async_crud.LeadMagnetNotFound:
+                # one unknown lead magnet fails the whole insert, retry the leads one by one
+                await self._flush_each(batch)
+                return
+            except Exception as e:
+                logger.error(f"Error writing batch of {len(batch)} leads: {str(e)}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+            self.batches += 1
+            self.leads += len(created)
+            for lead, _, future in batch:
+                # the same email twice in a batch: the first request gets the lead
+                if not future.done():
+                    future.set_result(created.pop(lead.email, None))
+        finally:
+            if acquired:
+                self._slots.release()
+
+    async def _flush_each(self, batch: List[PendingLead]):
+        for lead, send_welcome, future in batch:
+            try:
+                async with self.session_factory() as db:
+                    result = await async_crud.create_lead(db, lead, send_welcome)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(result)
+
+
+lead_ingest_buffer = LeadIngestBuffer()
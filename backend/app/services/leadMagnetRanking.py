@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import async_crud
+from database import AsyncSessionLocal
+from config import RANKING_WINDOW_HOURS, RANKING_MIN_VIEWS, RANKING_PERSIST_INTERVAL, RANKING_REFRESH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# (lead_magnet_id, views, leads, conversion_rate)
+Rank = Tuple[int, int, int, float]
+
+
+def _hour(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+class LeadMagnetRanker:
+    """
+    Live ranking of lead magnets by conversion rate (leads per landing page view).
+    Views and leads are counted in memory per lead magnet in hourly slots
+    covering the last window_hours hours. Window totals are updated on every
+    event and when the oldest slot expires, so top(k) is one heap selection
+    over the totals, without a query. Views are written as stats deltas every
+    persist_interval. Every refresh_interval the window is reloaded from the
+    stats rollup, which adds the counts of the other app workers (and imported
+    leads) and restores the ranking after a restart.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        window_hours: int = RANKING_WINDOW_HOURS,
+        min_views: int = RANKING_MIN_VIEWS,
+        persist_interval: float = RANKING_PERSIST_INTERVAL,
+        refresh_interval: float = RANKING_REFRESH_INTERVAL
+    ):
+        self.session_factory = session_factory
+        self.window_hours = window_hours
+        self.min_views = min_views
+        self.persist_interval = persist_interval
+        self.refresh_interval = refresh_interval
+        # hour -> lead magnet -> [views, leads]
+        self._slots: Dict[datetime, Dict[int, List[int]]] = {}
+        self._views: Counter = Counter()
+        self._leads: Counter = Counter()
+        # views counted here but not written yet, by (lead magnet, hour)
+        self._unsaved: Counter = Counter()
+        # leads recorded while a refresh reads the rollup, by (lead magnet, hour)
+        self._refresh_leads: Optional[Counter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Load the window and start syncing on the running (API) event loop"""
+        if self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop syncing and write the views not saved yet"""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.persist()
+        except Exception as e:
+            logger.error(f"Error saving landing page views: {str(e)}")
+
+    def record_view(self, lead_magnet_id: int, views: int = 1, now: Optional[datetime] = None):
+        hour = self._advance(now)
+        self._add(hour, lead_magnet_id, views, 0)
+        self._unsaved[(lead_magnet_id, hour)] += views
+
+    def record_lead(self, lead_magnet_id: int, now: Optional[datetime] = None):
+        """Count a captured lead; it is already in the stats through its insert"""
+        hour = self._advance(now)
+        self._add(hour, lead_magnet_id, 0, 1)
+        if self._refresh_leads is not None:
+            self._refresh_leads[(lead_magnet_id, hour)] += 1
+
+    def top(self, k: int, now: Optional[datetime] = None) -> List[Rank]:
+        """The k best converting lead magnets of the window with at least min_views views"""
+        self._advance(now)
+        ranked = heapq.nlargest(k, (
+            (self._leads[lead_magnet_id] / views, views, lead_magnet_id)
+            for lead_magnet_id, views in self._views.items()
+            # leads without views have no rate
+            if views > 0 and views >= self.min_views
+        ))
+        return [(lead_magnet_id, views, self._leads[lead_magnet_id], rate) for rate, views, lead_magnet_id in ranked]
+
+    def _window_start(self, hour: datetime) -> datetime:
+        return hour - timedelta(hours=self.window_hours - 1)
+
+    def _add(self, hour: datetime, lead_magnet_id: int, views: int, leads: int):
+        counts = self._slots.setdefault(hour, {}).setdefault(lead_magnet_id, [0, 0])
+        counts[0] += views
+        counts[1] += leads
+        self._views[lead_magnet_id] += views
+        self._leads[lead_magnet_id] += leads
+
+    def _advance(self, now: Optional[datetime] = None) -> datetime:
+        """Drop the slots that left the window; returns the current hour"""
+        hour = _hour(now or datetime.now(timezone.utc))
+        start = self._window_start(hour)
+        for expired in [slot for slot in self._slots if slot < start]:
+            for lead_magnet_id, (views, leads) in self._slots.pop(expired).items():
+                self._views[lead_magnet_id] -= views
+                self._leads[lead_magnet_id] -= leads
+                if self._views[lead_magnet_id] <= 0 and self._leads[lead_magnet_id] <= 0:
+                    del self._views[lead_magnet_id], self._leads[lead_magnet_id]
+        return hour
+
+    async def persist(self):
+        """Write the views counted since the last call as stats deltas"""
+        if not self._unsaved:
+            return
+        unsaved, self._unsaved = self._unsaved, Counter()
+        try:
+            async with self.session_factory() as db:
+                await async_crud.add_stats_views(
+                    db, [(lead_magnet_id, hour, views) for (lead_magnet_id, hour), views in unsaved.items()]
+                )
+        except Exception:
+            # retried on the next pass
+            self._unsaved.update(unsaved)
+            raise
+
+    async def refresh(self, now: Optional[datetime] = None):
+        """
+        Replace the window with the counts of the stats rollup. Leads recorded
+        while the rollup is read are added again; the read may already count
+        some of them, the next refresh evens that out.
+        """
+        start = self._window_start(_hour(now or datetime.now(timezone.utc)))
+        self._refresh_leads = Counter()
+        try:
+            async with self.session_factory() as db:
+                rows = await async_crud.get_stats_window(db, start)
+        finally:
+            recorded_leads, self._refresh_leads = self._refresh_leads, None
+        self._slots, self._views, self._leads = {}, Counter(), Counter()
+        for row in rows:
+            self._add(row.bucket, row.lead_magnet_id, row.views, row.leads)
+        for (lead_magnet_id, hour), leads in recorded_leads.items():
+            if hour >= start:
+                self._add(hour, lead_magnet_id, 0, leads)
+        # views not written yet aren't in the rollup
+        for (lead_magnet_id, hour), views in self._unsaved.items():
+            if hour >= start:
+                self._add(hour, lead_magnet_id, views, 0)
+        self._advance(now)
+
+    async def _run(self):
+        next_refresh = 0.0
+        while True:
+            try:
+                await self.persist()
+                if time.monotonic() >= next_refresh:
+                    await self.refresh()
+                    next_refresh = time.monotonic() + self.refresh_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Lead magnet ranking sync failed: {str(e)}")
+            await asyncio.sleep(self.persist_interval)
+
+
+lead_magnet_ranker = LeadMagnetRanker()
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import os
+import re
+from concurrent.futures import Future
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from database import engine
+from config import (
+    LEAD_PARTITION_MONTHS_AHEAD, LEAD_PARTITION_INTERVAL, LEAD_ARCHIVE_AFTER_MONTHS,
+    LEAD_ARCHIVE_MODE, LEAD_ARCHIVE_SCHEMA, LEAD_ARCHIVE_DIR,
+)
+from services.worker import BackgroundWorker, background_worker
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^leads_(\d{4})_(\d{2})$")
+DEFAULT_PARTITION = "leads_default"
+ARCHIVE_MODES = ("table", "parquet")
+# rows per parquet row group when archiving to files
+ARCHIVE_BATCH_SIZE = 50000
+# serializes maintenance of several app workers sharing the database
+MAINTENANCE_LOCK = "SELECT pg_advisory_xact_lock(hashtext('leads_partitions'))"
+IS_PARTITIONED = "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('leads'))"
+LIST_PARTITIONS = """
+SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'leads'::regclass
+"""
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"leads_{month.year:04d}_{month.month:02d}"
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+class LeadPartitionManager:
+    """
+    Maintains the monthly range partitions of leads.
+    Each run creates the partitions of the current month and the next
+    months_ahead months (plus a default partition as a safety net, whose rows
+    of a month move to the month's partition when it is created), and
+    archives partitions older than archive_after_months: "table" detaches them
+    into the archive schema, "parquet" writes them to compressed files under
+    archive_dir and drops them. Emails of archived leads stay registered.
+    """
+
+    def __init__(
+        self,
+        bind=engine,
+        months_ahead: int = LEAD_PARTITION_MONTHS_AHEAD,
+        archive_after_months: int = LEAD_ARCHIVE_AFTER_MONTHS,
+        archive_mode: str = LEAD_ARCHIVE_MODE,
+        archive_schema: str = LEAD_ARCHIVE_SCHEMA,
+        archive_dir: str = LEAD_ARCHIVE_DIR,
+        interval: float = LEAD_PARTITION_INTERVAL
+    ):
+        if archive_mode not in ARCHIVE_MODES:
+            raise ValueError(f"Unknown lead archive mode {archive_mode}, expected one of {', '.join(ARCHIVE_MODES)}")
+        self.bind = bind
+        self.months_ahead = months_ahead
+        self.archive_after_months = archive_after_months
+        self.archive_mode = archive_mode
+        self.archive_schema = archive_schema
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self._future: Optional[Future] = None
+
+    def start(self, worker: BackgroundWorker = background_worker):
+        if self._future and not self._future.done():
+            return
+        self._future = worker.submit(self.run())
+
+    def stop(self):
+        if self._future:
+            self._future.cancel()
+            self._future = None
+
+    async def run(self):
+        logger.info("Lead partition maintenance started")
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.maintain)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Lead partition maintenance failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def maintain(self, today: Optional[date] = None) -> Dict[str, List[str]]:
+        """Create upcoming partitions and archive expired ones; returns their names"""
+        today = today or datetime.now(timezone.utc).date()
+        created = self.ensure_partitions(today)
+        archived = []
+        if self.archive_after_months > 0:
+            cutoff = add_months(month_start(today), -self.archive_after_months)
+            for name in self.expired_partitions(cutoff):
+                self.archive_partition(name)
+                archived.append(name)
+        if created or archived:
+            logger.info(f"Lead partitions created: {created}, archived: {archived}")
+        return {"created": created, "archived": archived}
+
+    def ensure_partitions(self, today: Optional[date] = None) -> List[str]:
+        """Create the partitions up to months_ahead months from today that don't exist yet"""
+        today = today or datetime.now(timezone.utc).date()
+        with self.bind.begin() as conn:
+            if not conn.execute(text(IS_PARTITIONED)).scalar():
+                logger.error("leads is not a partitioned table, run `alembic upgrade head`")
+                return []
+            conn.execute(text(MAINTENANCE_LOCK))
+            existing = {name for name, in conn.execute(text(LIST_PARTITIONS))}
+            created = []
+            month = month_start(today)
+            for _ in range(self.months_ahead + 1):
+                name = partition_name(month)
+                if name not in existing:
+                    self._create_partition(conn, month, has_default=DEFAULT_PARTITION in existing)
+                    created.append(name)
+                month = add_months(month, 1)
+            if DEFAULT_PARTITION not in existing:
+                conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF leads DEFAULT"))
+        return created
+
+    def _create_partition(self, conn, month: date, has_default: bool):
+        name = partition_name(month)
+        # bounds in UTC, the timestamps are timestamptz
+        start, end = f"{month.isoformat()} 00:00:00+00", f"{add_months(month, 1).isoformat()} 00:00:00+00"
+        create = text(f"CREATE TABLE {name} PARTITION OF leads FOR VALUES FROM ('{start}') TO ('{end}')")
+        in_month = f"created_at >= '{start}' AND created_at < '{end}'"
+        stranded = has_default and conn.execute(
+            text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE {in_month}")
+        ).scalar()
+        if not stranded:
+            conn.execute(create)
+            return
+        # maintenance fell behind and leads of the month landed in the default
+        # partition, which then rejects the new partition: take the default out,
+        # move the month's rows into the new partition and put it back
+        logger.warning(f"Moving {stranded} leads from {DEFAULT_PARTITION} to the new partition {name}")
+        conn.execute(text(f"ALTER TABLE leads DETACH PARTITION {DEFAULT_PARTITION}"))
+        conn.execute(create)
+        conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_month} RETURNING *) "
+            f"INSERT INTO {name} (id, name, email, created_at, lead_magnet_id) "
+            f"SELECT id, name, email, created_at, lead_magnet_id FROM moved"
+        ))
+        conn.execute(text(f"ALTER TABLE leads ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+
+    def expired_partitions(self, cutoff: date) -> List[str]:
+        """Monthly partitions entirely before cutoff, oldest first"""
+        with self.bind.connect() as conn:
+            names = [name for name, in conn.execute(text(LIST_PARTITIONS))]
+        months = {name: partition_month(name) for name in names}
+        return sorted(name for name, month in months.items() if month and month < cutoff)
+
+    def archive_partition(self, name: str):
+        if self.archive_mode == "parquet":
+            self._archive_to_parquet(name)
+        else:
+            self._archive_to_table(name)
+
+    def _archive_to_table(self, name: str):
+        with self.bind.begin() as conn:
+            conn.execute(text(MAINTENANCE_LOCK))
+            conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {self.archive_schema}"))
+            conn.execute(text(f"ALTER TABLE leads DETACH PARTITION {name}"))
+            conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {self.archive_schema}"))
+
+    def _archive_to_parquet(self, name: str):
+        pa, pq = _pyarrow()
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{name}.parquet")
+        partial = f"{path}.partial"
+        schema = pa.schema([
+            ("id", pa.int32()),
+            ("name", pa.string()),
+            ("email", pa.string()),
+            ("lead_magnet_id", pa.int32()),
+            ("created_at", pa.timestamp("us", tz="UTC")),
+        ])
+        query = text(f"SELECT {', '.join(schema.names)} FROM {name} ORDER BY id")
+        with self.bind.begin() as conn:
+            conn.execute(text(MAINTENANCE_LOCK))
+            # no writes to the partition between the export and the drop
+            conn.execute(text(f"LOCK TABLE {name} IN SHARE MODE"))
+            result = conn.execute(query.execution_options(stream_results=True, yield_per=ARCHIVE_BATCH_SIZE))
+            with pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+                for rows in result.partitions():
+                    writer.write_batch(pa.RecordBatch.from_arrays(
+                        [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                        schema=schema,
+                    ))
+            # the file is in place before the rows are gone
+            os.replace(partial, path)
+            conn.execute(text(f"ALTER TABLE leads DETACH PARTITION {name}"))
+            conn.execute(text(f"DROP TABLE {name}"))
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("LEAD_ARCHIVE_MODE=parquet needs pyarrow, install it with `pip install pyarrow`") from e
+    return pyarrow, pyarrow.parquet
+
+
+lead_partitions = LeadPartitionManager()
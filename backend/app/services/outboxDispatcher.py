@@ -0,0 +1,262 @@
+import asyncio
+import logging
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+import crud
+from database import SessionLocal
+from models import EmailTemplate, LeadMagnet
+from config import (
+    OUTBOX_BATCH_SIZE,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_RETRY_BASE_SECONDS,
+    OUTBOX_LEASE_SECONDS,
+    BULK_SEND_CHUNK_SIZE,
+)
+from services.assetsSevice import AssetService
+from services.bulkSender import AsyncBulkSender, BulkSendJob, plan_domain_batches, email_domain
+from services.emails import EmailService, asset_version
+from services.worker import BackgroundWorker, background_worker
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """
+    Delivers rows of the email_outbox table.
+    Each sweep claims a batch of due rows (SELECT ... FOR UPDATE SKIP LOCKED, so
+    several processes can dispatch side by side), groups them by recipient
+    domain, sends them concurrently through AsyncBulkSender (throttled per
+    provider and per domain) and records the outcome. Failed sends are retried with
+    exponential backoff until OUTBOX_MAX_ATTEMPTS; rows claimed by a dispatcher
+    that crashed are picked up again once their lease expires.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        email_service: Optional[EmailService] = None,
+        asset_service: Optional[AssetService] = None,
+        sender: Optional[AsyncBulkSender] = None,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+        retry_base_seconds: float = OUTBOX_RETRY_BASE_SECONDS,
+        lease_seconds: int = OUTBOX_LEASE_SECONDS
+    ):
+        self.session_factory = session_factory
+        self.email_service = email_service or EmailService()
+        self.asset_service = asset_service or AssetService()
+        self.sender = sender or AsyncBulkSender(self.email_service)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.lease_seconds = lease_seconds
+        self._future: Optional[Future] = None
+
+    # ---------- lifecycle ----------
+
+    def start(self, worker: BackgroundWorker = background_worker):
+        if self._future and not self._future.done():
+            return
+        self._future = worker.submit(self.run())
+
+    def stop(self):
+        if self._future:
+            self._future.cancel()
+            self._future = None
+
+    async def run(self):
+        """Dispatch forever, sleeping only when the outbox is drained"""
+        logger.info("Outbox dispatcher started")
+        while True:
+            try:
+                dispatched = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {str(e)}")
+                dispatched = 0
+            if dispatched < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def dispatch_once(self) -> int:
+        """Claim, send and record one batch; returns the number of rows claimed"""
+        loop = asyncio.get_running_loop()
+        items = await loop.run_in_executor(None, self._claim)
+        if not items:
+            return 0
+
+        # per domain batches; identical nurture emails share one SMTP transaction
+        batches = plan_domain_batches(
+            items,
+            email_of=lambda item: item["lead"]["email"],
+            share_key=self._share_key
+        )
+        await self.sender.run(
+            batches,
+            self._deliver_batch,
+            job=BulkSendJob(total=len(items), description="outbox"),
+            domain_of=lambda batch: email_domain(batch[0]["lead"]["email"]),
+            recipients_of=len
+        )
+        await loop.run_in_executor(None, self._record, items)
+        return len(items)
+
+    def _share_key(self, item: Dict[str, Any]):
+        """Items with the same key render to the same message"""
+        template = item["email_template"]
+        if item["kind"] == "nurture" and template and not self.email_service.is_personalized(template):
+            return ("nurture", item["email_template_id"])
+        return None
+
+    # ---------- campaigns ----------
+
+    def submit_campaign(self, email_template_id: int, worker: BackgroundWorker = background_worker) -> Future:
+        """Queue a template for every lead of its lead magnet, on the background worker"""
+        async def enqueue():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.enqueue_campaign, email_template_id)
+        return worker.submit(enqueue())
+
+    def enqueue_campaign(self, email_template_id: int, chunk_size: int = BULK_SEND_CHUNK_SIZE) -> int:
+        """
+        Stream the leads in keyset chunks into the outbox, committing every
+        chunk so the dispatcher starts sending before the last lead is read
+        """
+        db = self.session_factory()
+        try:
+            email_template = crud.get_email_template(db, email_template_id)
+            if not email_template:
+                return 0
+            queued = 0
+            for leads in crud.iter_leads_by_lead_magnet(db, email_template.lead_magnet_id, chunk_size):
+                queued += crud.enqueue_nurture_emails(db, email_template, leads)
+                db.commit()
+            logger.info(f"Campaign for email template {email_template_id}: {queued} emails queued")
+            return queued
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to queue campaign for email template {email_template_id}: {str(e)}")
+            raise
+        finally:
+            db.close()
+
+    # ---------- steps (run in executor threads) ----------
+
+    def _claim(self) -> List[Dict[str, Any]]:
+        """Claim due rows and load what is needed to render them, as plain dicts"""
+        db = self.session_factory()
+        try:
+            rows = crud.claim_outbox_batch(db, limit=self.batch_size, lease_seconds=self.lease_seconds)
+            if not rows:
+                return []
+            template_ids = {row.email_template_id for row in rows if row.email_template_id}
+            lead_magnet_ids = {row.lead_magnet_id for row in rows if row.kind == "welcome"}
+            templates = {
+                t.id: {"subject": t.subject, "body": t.body, "sequence_number": t.sequence_number}
+                for t in db.query(EmailTemplate).filter(EmailTemplate.id.in_(template_ids))
+            } if template_ids else {}
+            lead_magnets = {}
+            if lead_magnet_ids:
+                for lm in db.query(LeadMagnet).filter(LeadMagnet.id.in_(lead_magnet_ids)):
+                    lead_magnets[lm.id] = {
+                        "id": lm.id,
+                        "title": lm.title,
+                        "type": lm.type.value,
+                        "value_promise": lm.value_promise,
+                        "content": lm.content,
+                    }
+                    # fingerprint once per batch, it keys the shared attachment cache
+                    lead_magnets[lm.id]["asset_version"] = asset_version(lead_magnets[lm.id])
+            return [
+                {
+                    "id": row.id,
+                    "kind": row.kind,
+                    "attempts": row.attempts,
+                    "email_template_id": row.email_template_id,
+                    "lead": {"id": row.lead_id, "name": row.to_name, "email": row.to_email},
+                    "email_template": templates.get(row.email_template_id),
+                    "lead_magnet": lead_magnets.get(row.lead_magnet_id),
+                }
+                for row in rows
+            ]
+        finally:
+            db.close()
+
+    def _deliver_batch(self, batch: List[Dict[str, Any]]) -> bool:
+        """Send a planned batch, marks every item sent or not; returns whether all were sent"""
+        if len(batch) == 1:
+            item = batch[0]
+            try:
+                item["sent"] = self._deliver(item)
+            except Exception as e:
+                item["sent"] = False
+                item["error"] = str(e)
+            return item["sent"]
+        # shared nurture message: one transaction, one RCPT TO per lead
+        failed = set(self.email_service.send_nurture_email_batch(
+            [item["lead"] for item in batch], batch[0]["email_template"]
+        ))
+        for item in batch:
+            item["sent"] = item["lead"]["email"] not in failed
+            if not item["sent"]:
+                item["error"] = "SMTP send failed"
+        return not failed
+
+    def _deliver(self, item: Dict[str, Any]) -> bool:
+        """Send one outbox item, returns success"""
+        if item["kind"] == "welcome":
+            lead_magnet = item["lead_magnet"]
+            if not lead_magnet or not lead_magnet.get("content"):
+                item["error"] = "lead magnet missing or has no content"
+                item["permanent"] = True
+                return False
+            # rendered and encoded once per (lead magnet, asset version), shared by every recipient
+            attachment_part = self.email_service.get_lead_magnet_attachment(
+                lead_magnet, self.asset_service.generate_asset
+            )
+            success = self.email_service.send_welcome_email(
+                lead=item["lead"],
+                lead_magnet=lead_magnet,
+                attachment_part=attachment_part
+            )
+        elif item["kind"] == "nurture":
+            if not item["email_template"]:
+                item["error"] = "email template no longer exists"
+                item["permanent"] = True
+                return False
+            success = self.email_service.send_nurture_email(item["lead"], item["email_template"])
+        else:
+            item["error"] = f"unknown outbox kind: {item['kind']}"
+            item["permanent"] = True
+            return False
+        if not success:
+            item["error"] = "SMTP send failed"
+        return success
+
+    def _retry_at(self, attempts: int) -> Optional[datetime]:
+        """Exponential backoff, None once the attempts are exhausted"""
+        if attempts >= self.max_attempts:
+            return None
+        delay = self.retry_base_seconds * (2 ** (attempts - 1))
+        return datetime.now(timezone.utc) + timedelta(seconds=delay)
+
+    def _record(self, items: List[Dict[str, Any]]):
+        db = self.session_factory()
+        try:
+            crud.mark_outbox_sent(db, [item["id"] for item in items if item.get("sent")])
+            for item in items:
+                if item.get("sent"):
+                    continue
+                retry_at = None if item.get("permanent") else self._retry_at(item["attempts"])
+                crud.mark_outbox_failed(db, item["id"], item.get("error", "send failed"), retry_at)
+                if retry_at is None:
+                    logger.error(f"Giving up on outbox email {item['id']} to {item['lead']['email']}")
+        finally:
+            db.close()
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,207 @@
+import smtplib
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from email.message import Message
+from queue import LifoQueue, Empty
+from typing import Optional, List
+from config import (
+    SMTP_SERVER,
+    SMTP_PORT,
+    SMTP_USERNAME,
+    SMTP_PASSWORD,
+    SMTP_USE_TLS,
+    SMTP_POOL_SIZE,
+    SMTP_MAX_MESSAGES_PER_CONNECTION,
+    SMTP_IDLE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+
+def is_connection_error(error: Exception) -> bool:
+    """True when the connection itself is gone and the send can be retried on a new one"""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421 means the server is closing the channel
+        return error.smtp_code == 421
+    if isinstance(error, smtplib.SMTPException):
+        # refused recipients/sender: smtplib already reset the session
+        return False
+    return isinstance(error, OSError)
+
+
+class PooledConnection:
+    """An authenticated SMTP connection plus its usage bookkeeping"""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+        self.broken = False
+
+    def is_alive(self) -> bool:
+        """Cheap liveness probe used before reusing an idle connection"""
+        try:
+            return self.server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class SMTPConnectionPool:
+    """
+    Thread safe pool of authenticated SMTP connections.
+    Connections are reused across messages (one STARTTLS + LOGIN per connection),
+    recycled after max_messages_per_connection sends, probed with NOOP when they
+    have been idle longer than idle_timeout, and replaced when they fail.
+    """
+
+    def __init__(
+        self,
+        host: str = SMTP_SERVER,
+        port=SMTP_PORT,
+        username: Optional[str] = SMTP_USERNAME,
+        password: Optional[str] = SMTP_PASSWORD,
+        max_size: int = SMTP_POOL_SIZE,
+        max_messages_per_connection: int = SMTP_MAX_MESSAGES_PER_CONNECTION,
+        idle_timeout: float = SMTP_IDLE_TIMEOUT,
+        use_tls: bool = SMTP_USE_TLS,
+        timeout: float = 30
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max_size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._idle: LifoQueue = LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        # counters, mostly for benchmarks and logs
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    def _connect(self) -> PooledConnection:
+        """Open, secure and authenticate a new SMTP connection"""
+        try:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception as e:
+            logger.error(f"Failed to connect to SMTP server: {str(e)}")
+            raise
+        with self._lock:
+            self.connections_opened += 1
+        return PooledConnection(server)
+
+    def _checkout(self) -> PooledConnection:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except Empty:
+                return self._connect()
+            if time.monotonic() - conn.last_used < self.idle_timeout or conn.is_alive():
+                return conn
+            # the server dropped it while it was idle
+            conn.close()
+
+    def _checkin(self, conn: PooledConnection):
+        conn.last_used = time.monotonic()
+        if (
+            self._closed
+            or conn.broken
+            or conn.messages_sent >= self.max_messages_per_connection
+        ):
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, blocking while max_size connections are in use"""
+        if self._closed:
+            raise RuntimeError("SMTP connection pool is closed")
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception as e:
+            if conn and (is_connection_error(e) or not isinstance(e, smtplib.SMTPException)):
+                conn.broken = True
+            raise
+        finally:
+            if conn:
+                self._checkin(conn)
+            self._slots.release()
+
+    def send_message(
+        self,
+        msg: Message,
+        from_addr: Optional[str] = None,
+        to_addrs: Optional[List[str]] = None,
+        retries: int = 1
+    ):
+        """Send a message on a pooled connection, reconnecting on connection failures"""
+        attempt = 0
+        while True:
+            try:
+                with self.connection() as conn:
+                    result = conn.server.send_message(msg, from_addr=from_addr, to_addrs=to_addrs)
+                    conn.messages_sent += 1
+                with self._lock:
+                    self.messages_sent += 1
+                return result
+            except Exception as e:
+                if not is_connection_error(e) or attempt >= retries:
+                    raise
+                attempt += 1
+                logger.warning(f"SMTP connection failed ({str(e)}), reconnecting (attempt {attempt})")
+
+    def close(self):
+        """Close every idle connection; busy ones are closed when returned"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
+
+
+_default_pool: Optional[SMTPConnectionPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    """Process wide pool shared by every EmailService"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool._closed:
+            _default_pool = SMTPConnectionPool()
+        return _default_pool
+
+
+def close_smtp_pool():
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+            _default_pool = None
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from concurrent.futures import Future
+from typing import Optional
+import crud
+from database import SessionLocal
+from config import STATS_COMPACTION_INTERVAL, STATS_COMPACTION_BATCH_SIZE
+from services.worker import BackgroundWorker, background_worker
+
+logger = logging.getLogger(__name__)
+
+
+class StatsCompactor:
+    """
+    Folds lead_magnet_stats_deltas into the hourly lead_magnet_stats rollup.
+    Writers only ever append deltas; each pass moves a batch of them into the
+    rollup in one statement, full batches are followed by another pass right away.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        interval: float = STATS_COMPACTION_INTERVAL,
+        batch_size: int = STATS_COMPACTION_BATCH_SIZE
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self._future: Optional[Future] = None
+
+    def start(self, worker: BackgroundWorker = background_worker):
+        if self._future and not self._future.done():
+            return
+        self._future = worker.submit(self.run())
+
+    def stop(self):
+        if self._future:
+            self._future.cancel()
+            self._future = None
+
+    async def run(self):
+        logger.info("Stats compactor started")
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                folded = await loop.run_in_executor(None, self.compact_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stats compaction failed: {str(e)}")
+                folded = 0
+            if folded < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    def compact_once(self) -> int:
+        """Fold one batch of deltas; returns how many were folded"""
+        db = self.session_factory()
+        try:
+            return crud.compact_stats_deltas(db, limit=self.batch_size)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+stats_compactor = StatsCompactor()
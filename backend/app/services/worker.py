@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Optional, Coroutine, Any
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """
+    Dedicated event loop running in its own thread.
+    Long running jobs (bulk sends, dispatchers) are submitted here so they
+    don't hold a request worker or block the API event loop.
+    """
+
+    def __init__(self, name: str = "background-worker"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the loop thread (idempotent)"""
+        if self.running:
+            return
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        logger.info(f"{self.name} started")
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+
+    def submit(self, coro: Coroutine[Any, Any, Any]) -> Future:
+        """Schedule a coroutine on the worker loop from any thread"""
+        if not self.running:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self, timeout: float = 10):
+        """Stop the loop, cancelling whatever is still running"""
+        if not self.running:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"{self.name} stopped")
+
+
+background_worker = BackgroundWorker()
@@ -0,0 +1,74 @@
+"""SQL statements and row builders shared by crud.py (sync, background services)
+and async_crud.py (routers). They only build statements, the callers execute them.
+"""
+from typing import List, Dict
+from sqlalchemy import func, insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import (
+    Lead, EmailTemplate, EmailOutbox, LeadSequence, SequenceStatusEnum, LeadMagnetStatsDelta,
+)
+
+
+# ==================== EMAIL OUTBOX ====================
+
+def outbox_insert(rows: List[Dict]):
+    """INSERT of outbox rows that skips idempotency keys already queued"""
+    return pg_insert(EmailOutbox).values(rows).on_conflict_do_nothing(index_elements=["idempotency_key"])
+def welcome_outbox_row(lead: Lead) -> Dict:
+    return {
+        "idempotency_key": f"welcome:{lead.id}:{lead.lead_magnet_id}",
+        "kind": "welcome",
+        "lead_id": lead.id,
+        "lead_magnet_id": lead.lead_magnet_id,
+        "to_email": lead.email,
+        "to_name": lead.name,
+    }
+def nurture_outbox_row(email_template: EmailTemplate, lead: Lead) -> Dict:
+    return {
+        "idempotency_key": f"nurture:{lead.id}:{email_template.id}",
+        "kind": "nurture",
+        "lead_id": lead.id,
+        "lead_magnet_id": email_template.lead_magnet_id,
+        "email_template_id": email_template.id,
+        "to_email": lead.email,
+        "to_name": lead.name,
+    }
+
+# ==================== DRIP SEQUENCES ====================
+
+# Upsert that (re)starts the nurture sequence of a lead, the first email is due right away
+def lead_sequence_upsert(lead: Lead, first_sequence_number: int):
+    stmt = pg_insert(LeadSequence).values(
+        lead_id=lead.id,
+        lead_magnet_id=lead.lead_magnet_id,
+        next_position=0,
+        next_sequence_number=first_sequence_number,
+        next_send_at=func.now(),
+        status=SequenceStatusEnum.active,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["lead_id"],
+        set_={
+            "lead_magnet_id": stmt.excluded.lead_magnet_id,
+            "next_position": stmt.excluded.next_position,
+            "next_sequence_number": stmt.excluded.next_sequence_number,
+            "next_send_at": stmt.excluded.next_send_at,
+            "status": stmt.excluded.status,
+            "updated_at": func.now(),
+        },
+    )
+    return stmt
+
+# ==================== LEAD MAGNET STATS ====================
+
+def stats_bucket(timestamp):
+    """Hour (UTC) a change at timestamp is counted in"""
+    return func.date_trunc(text("'hour'"), timestamp, text("'UTC'"))
+def stats_delta_insert(lead_magnet_id: int, timestamp, leads: int = 0, emails_sent: int = 0, views: int = 0):
+    return insert(LeadMagnetStatsDelta).values(
+        lead_magnet_id=lead_magnet_id,
+        bucket=stats_bucket(timestamp),
+        leads=leads,
+        emails_sent=emails_sent,
+        views=views,
+    )
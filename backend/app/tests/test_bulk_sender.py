@@ -0,0 +1,86 @@
+import pytest
+from services.bulkSender import TokenBucket, email_domain, plan_domain_batches
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_bursts_up_to_capacity(clock):
+    bucket = TokenBucket(rate=4, capacity=5)
+    for _ in range(5):
+        await bucket.acquire()
+    assert clock.slept == []
+    await bucket.acquire()
+    assert clock.slept == [0.25]
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_refill_is_capped(clock):
+    bucket = TokenBucket(rate=4, capacity=2)
+    await bucket.acquire(2)
+    clock.now += 64
+    await bucket.acquire(2)
+    assert clock.slept == []
+    await bucket.acquire()
+    assert clock.slept == [0.25]
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_oversized_request_leaves_debt(clock):
+    bucket = TokenBucket(rate=4, capacity=2)
+    await bucket.acquire(5)
+    assert clock.slept == []
+    assert bucket.tokens == -3
+    await bucket.acquire()
+    # 3 tokens of debt and 1 for this request
+    assert clock.slept == [1.0]
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_without_rate_never_waits(clock):
+    bucket = TokenBucket(rate=0)
+    for _ in range(100):
+        await bucket.acquire()
+    assert clock.slept == []
+
+
+def _plan(emails, shared=True, **kwargs):
+    return list(plan_domain_batches(
+        emails,
+        email_of=lambda email: email,
+        share_key=lambda email: "template" if shared else None,
+        **kwargs
+    ))
+
+
+def test_email_domain():
+    assert email_domain("Ana@Example.COM ") == "example.com"
+    assert email_domain("nobody") == ""
+    assert email_domain(None) == ""
+
+
+def test_shared_batches_by_domain_round_robin():
+    emails = ["a1@a.com", "a2@A.com", "a3@a.com", "b1@b.com", "c1@c.com"]
+    assert _plan(emails, max_recipients=2) == [
+        ["a1@a.com", "a2@A.com"],
+        ["b1@b.com"],
+        ["c1@c.com"],
+        ["a3@a.com"],
+    ]
+
+
+def test_unshareable_items_are_sent_alone():
+    emails = ["a1@a.com", "a2@a.com", "b1@b.com"]
+    assert _plan(emails, shared=False) == [["a1@a.com"], ["b1@b.com"], ["a2@a.com"]]
+
+
+def test_batches_are_planned_per_window():
+    emails = ["a1@a.com", "b1@b.com", "a2@a.com", "a3@a.com"]
+    # a3 is in the second window, it can't join the a batch of the first one
+    assert _plan(emails, window=3) == [["a1@a.com", "a2@a.com"], ["b1@b.com"], ["a3@a.com"]]
+
+
+def test_every_item_is_planned_once():
+    emails = [f"lead{i}@domain{i % 7}.com" for i in range(1000)]
+    batches = _plan(emails, max_recipients=50, window=300)
+    assert sorted(email for batch in batches for email in batch) == sorted(emails)
+    assert all(len({email_domain(email) for email in batch}) == 1 for batch in batches)
+    assert max(len(batch) for batch in batches) <= 50
@@ -0,0 +1,32 @@
+from models import SequenceStatusEnum
+
+
+def test_advance_walks_templates_sharing_a_sequence_number(drip_scheduler, make_sequence, make_templates, now):
+    sequence, templates = make_sequence(), make_templates(1, 1, 1)
+    sent = []
+    for _ in range(3):
+        assert sequence.status == SequenceStatusEnum.active
+        sent.append(drip_scheduler.advance(sequence, templates, now).id)
+    assert sent == [1, 2, 3]
+    assert sequence.status == SequenceStatusEnum.completed
+    assert sequence.next_send_at is None
+
+
+def test_advance_schedules_the_next_template(drip_scheduler, make_sequence, make_templates, now):
+    sequence, templates = make_sequence(), make_templates(1, 2, 5)
+    assert drip_scheduler.advance(sequence, templates, now).id == 1
+    assert sequence.next_position == 1
+    assert sequence.next_sequence_number == 2
+    assert sequence.next_send_at == now + drip_scheduler.delay
+    assert drip_scheduler.advance(sequence, templates, now).id == 2
+    assert sequence.next_sequence_number == 5
+
+
+def test_advance_completes_when_templates_run_out(drip_scheduler, make_sequence, make_templates, now):
+    sequence = make_sequence()
+    assert drip_scheduler.advance(sequence, [], now) is None
+    assert sequence.status == SequenceStatusEnum.completed
+    # templates deleted after the sequence started
+    sequence = make_sequence(next_position=4)
+    assert drip_scheduler.advance(sequence, make_templates(1, 2), now) is None
+    assert sequence.status == SequenceStatusEnum.completed
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from services import leadMagnetRanking
+
+NOW = datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc)
+HOUR = NOW.replace(minute=0)
+
+
+def _record(ranker, lead_magnet_id, views, leads, now=NOW):
+    ranker.record_view(lead_magnet_id, views, now=now)
+    for _ in range(leads):
+        ranker.record_lead(lead_magnet_id, now=now)
+
+
+def test_top_ranks_by_conversion_rate(make_ranker):
+    ranker = make_ranker()
+    _record(ranker, 1, views=100, leads=5)
+    _record(ranker, 2, views=10, leads=3)
+    _record(ranker, 3, views=50, leads=10)
+    assert ranker.top(3, now=NOW) == [(2, 10, 3, 0.3), (3, 50, 10, 0.2), (1, 100, 5, 0.05)]
+    assert [rank[0] for rank in ranker.top(1, now=NOW)] == [2]
+
+
+def test_top_ignores_lead_magnets_under_min_views(make_ranker):
+    ranker = make_ranker(min_views=20)
+    _record(ranker, 1, views=100, leads=5)
+    _record(ranker, 2, views=10, leads=9)
+    assert [rank[0] for rank in ranker.top(5, now=NOW)] == [1]
+
+
+def test_top_skips_leads_without_views(make_ranker):
+    ranker = make_ranker(min_views=0)
+    ranker.record_lead(7, now=NOW)
+    _record(ranker, 1, views=4, leads=1)
+    assert ranker.top(5, now=NOW) == [(1, 4, 1, 0.25)]
+
+
+def test_slots_leave_the_window(make_ranker):
+    ranker = make_ranker(window_hours=3)
+    _record(ranker, 1, views=10, leads=1, now=NOW - timedelta(hours=2))
+    _record(ranker, 1, views=10, leads=4, now=NOW)
+    assert ranker.top(1, now=NOW) == [(1, 20, 5, 0.25)]
+    # the oldest hour expires, the counts of the others stay
+    assert ranker.top(1, now=NOW + timedelta(hours=1)) == [(1, 10, 4, 0.4)]
+    assert ranker.top(1, now=NOW + timedelta(hours=3)) == []
+    assert not ranker._views and not ranker._leads
+
+
+@pytest.mark.asyncio
+async def test_refresh_keeps_events_the_rollup_misses(monkeypatch, make_ranker):
+    ranker = make_ranker()
+    ranker.record_view(1, 5, now=NOW)
+
+    async def get_stats_window(db, start):
+        assert start == HOUR - timedelta(hours=23)
+        # a lead captured while the rollup is read
+        ranker.record_lead(1, now=NOW)
+        return [
+            SimpleNamespace(bucket=HOUR, lead_magnet_id=1, views=20, leads=2),
+            SimpleNamespace(bucket=HOUR - timedelta(hours=30), lead_magnet_id=2, views=9, leads=9),
+        ]
+
+    monkeypatch.setattr(leadMagnetRanking.async_crud, "get_stats_window", get_stats_window)
+    await ranker.refresh(now=NOW)
+    # the 5 views not written yet and the lead recorded during the query
+    assert ranker.top(5, now=NOW) == [(1, 25, 3, 0.12)]
+    assert ranker._refresh_leads is None
@@ -0,0 +1,31 @@
+from datetime import date
+import pytest
+from services.leadPartitions import add_months, month_start, partition_month, partition_name
+
+
+@pytest.mark.parametrize("month, months, expected", [
+    (date(2026, 10, 1), 0, date(2026, 10, 1)),
+    (date(2026, 10, 1), 2, date(2026, 12, 1)),
+    (date(2026, 10, 1), 3, date(2027, 1, 1)),
+    (date(2026, 10, 1), 27, date(2029, 1, 1)),
+    (date(2026, 1, 1), -1, date(2025, 12, 1)),
+    (date(2026, 3, 1), -14, date(2025, 1, 1)),
+])
+def test_add_months(month, months, expected):
+    assert add_months(month, months) == expected
+
+
+def test_month_start():
+    assert month_start(date(2026, 2, 28)) == date(2026, 2, 1)
+    assert add_months(month_start(date(2026, 1, 31)), 1) == date(2026, 2, 1)
+
+
+def test_partition_name_round_trip():
+    for month in (date(2026, 1, 1), date(2026, 12, 1), date(999, 5, 1)):
+        assert partition_month(partition_name(month)) == month
+    assert partition_name(date(2026, 3, 1)) == "leads_2026_03"
+
+
+@pytest.mark.parametrize("name", ["leads_default", "leads_2026_3", "leads_2026_03_old", "lead_emails", "leads"])
+def test_partition_month_ignores_other_tables(name):
+    assert partition_month(name) is None
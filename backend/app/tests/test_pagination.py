@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from pagination import cursor_query, decode_cursor, encode_cursor, next_cursor
+
+
+def _encode(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("created_at", [
+    datetime(2026, 10, 18, 22, 3, 29, 123456, tzinfo=timezone.utc),
+    datetime(2026, 1, 1, tzinfo=timezone(timedelta(hours=-5))),
+    datetime(2026, 1, 1),
+])
+def test_cursor_round_trip(created_at):
+    cursor = encode_cursor(SimpleNamespace(created_at=created_at, id=4711))
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 4711)
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    "é",
+    "AAAA",
+    _encode({"created_at": "2026-01-01"}),
+    _encode(5),
+    _encode(["2026-01-01T00:00:00"]),
+    _encode(["yesterday", 1]),
+    _encode([1, 2]),
+    _encode(["2026-01-01T00:00:00", None]),
+    _encode(["2026-01-01T00:00:00", "x"]),
+])
+def test_malformed_cursor_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+    with pytest.raises(HTTPException) as e:
+        cursor_query(cursor)
+    assert e.value.status_code == 400
+
+
+def test_next_cursor_only_after_full_page():
+    rows = [SimpleNamespace(created_at=datetime(2026, 1, day, tzinfo=timezone.utc), id=day) for day in (1, 2)]
+    assert decode_cursor(next_cursor(rows, limit=2)) == (rows[-1].created_at, 2)
+    assert next_cursor(rows, limit=3) is None
+    assert cursor_query(None) is None
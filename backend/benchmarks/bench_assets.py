@@ -0,0 +1,228 @@
+"""
+Benchmark the AssetService renderers against synthetic lead magnet content.
+
+Usage (from the backend directory):
+    python benchmarks/bench_assets.py --save-baseline     # run and record the baseline of this machine
+    python benchmarks/bench_assets.py                     # run and compare with it
+    python benchmarks/bench_assets.py --sizes 5 50 --iterations 10 --cases checklist report
+
+Every renderer is run against content with 5-500 steps/sections. For each
+(renderer, size) it reports latency percentiles, throughput per core (renders/s
+of a single process, the renderers are CPU bound and single threaded) and the
+peak Python memory allocated during one render. The exit code is 1 when any
+metric regressed by more than --tolerance against the baseline. Baselines
+hold absolute timings, so they are recorded per machine (benchmarks/baselines
+is not committed) and a baseline recorded elsewhere is ignored.
+"""
+import argparse
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from typing import Dict, Any, List, Callable
+
+from common import (
+    add_app_to_path,
+    summarize_latencies,
+    load_baseline,
+    save_baseline,
+    compare_to_baseline,
+    print_table,
+)
+
+add_app_to_path()
+from services.assetsSevice import AssetService  # noqa: E402
+
+BASELINE_NAME = "assets"
+DEFAULT_SIZES = [5, 50, 200, 500]
+WORDS = (
+    "lead audience offer funnel email growth revenue client process system "
+    "automation content strategy launch value result conversion pipeline"
+).split()
+
+# metrics checked for regressions and which direction is better
+REGRESSION_METRICS = {
+    "p50_ms": "lower",
+    "p95_ms": "lower",
+    "throughput_per_core": "higher",
+    "peak_memory_kb": "lower",
+}
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_checklist(size: int, rng: random.Random) -> Dict[str, Any]:
+    steps = [
+        {
+            "step": i + 1,
+            "title": _sentence(rng, 5),
+            "description": " ".join(_sentence(rng, 14) for _ in range(2)),
+            "time_estimate": f"{rng.randint(5, 120)} minutes",
+        }
+        for i in range(size)
+    ]
+    return {"type": "checklist", "steps": steps, "deliverable": "PDF Checklist"}
+
+
+def make_template(size: int, rng: random.Random) -> Dict[str, Any]:
+    sections = [_sentence(rng, 3) for _ in range(size)]
+    lines = []
+    for section in sections:
+        lines.append(f"## {section}")
+        lines.append(f"[{_sentence(rng, 12)}]")
+        lines.append("")
+    return {
+        "type": "template",
+        "sections": sections,
+        "content": "\n".join(lines),
+        "format": "Editable Template",
+    }
+
+
+def make_report(size: int, rng: random.Random) -> Dict[str, Any]:
+    sections = [
+        {"title": _sentence(rng, 4), "content": " ".join(_sentence(rng, 16) for _ in range(4))}
+        for _ in range(size)
+    ]
+    return {"type": "report", "sections": sections, "pages": size, "deliverable": "PDF Report"}
+
+
+def make_calculator(size: int, rng: random.Random) -> Dict[str, Any]:
+    inputs = [
+        {
+            "name": f"input_{i}",
+            "label": _sentence(rng, 3),
+            "type": "number",
+            "placeholder": f"e.g., {rng.randint(1, 100)}",
+        }
+        for i in range(size)
+    ]
+    formula = "total = " + " + ".join(inp["name"] for inp in inputs)
+    return {
+        "type": "calculator",
+        "inputs": inputs,
+        "formula": formula,
+        "output": {"label": "Total", "unit": "$"},
+    }
+
+
+def make_lead_magnet(lead_type: str, size: int, seed: int = 42) -> Dict[str, Any]:
+    """Build a deterministic synthetic lead magnet with `size` steps/sections/inputs"""
+    rng = random.Random(f"{seed}-{lead_type}-{size}")
+    content = CONTENT_FACTORIES[lead_type](size, rng)
+    return {
+        "id": size,
+        "title": f"Benchmark {lead_type.title()} ({size})",
+        "type": lead_type,
+        "value_promise": _sentence(rng, 12),
+        "content": content,
+    }
+
+
+CONTENT_FACTORIES: Dict[str, Callable[[int, random.Random], Dict[str, Any]]] = {
+    "checklist": make_checklist,
+    "template": make_template,
+    "report": make_report,
+    "calculator": make_calculator,
+}
+
+
+def renderers(service: AssetService) -> Dict[str, Callable[[Dict[str, Any]], Any]]:
+    return {
+        "checklist": service.generate_checklist_pdf,
+        "template": service.generate_template_file,
+        "report": service.generate_report_pdf,
+        "calculator": service.generate_calculator_html,
+    }
+
+
+def measure_peak_memory(render: Callable, lead_magnet: Dict[str, Any]) -> float:
+    """Peak Python memory (KiB) allocated while rendering once"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        render(lead_magnet)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def bench_renderer(render: Callable, lead_magnet: Dict[str, Any], iterations: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        render(lead_magnet)
+
+    samples: List[float] = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        render(lead_magnet)
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+
+    stats = summarize_latencies(samples)
+    stats["throughput_per_core"] = iterations / elapsed if elapsed else 0.0
+    stats["peak_memory_kb"] = measure_peak_memory(render, lead_magnet)
+    return stats
+
+
+def run(cases: List[str], sizes: List[int], iterations: int, warmup: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    service = AssetService()
+    available = renderers(service)
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for case in cases:
+        results[case] = {}
+        for size in sizes:
+            lead_magnet = make_lead_magnet(case, size)
+            results[case][str(size)] = bench_renderer(available[case], lead_magnet, iterations, warmup)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark AssetService renderers")
+    parser.add_argument("--cases", nargs="+", default=list(CONTENT_FACTORIES), choices=list(CONTENT_FACTORIES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed relative regression (0.20 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.cases, args.sizes, args.iterations, args.warmup)
+
+    rows = [
+        {"renderer": case, "size": size, **values}
+        for case, sizes in results.items()
+        for size, values in sizes.items()
+    ]
+    print_table(
+        f"AssetService renderers ({args.iterations} iterations)",
+        rows,
+        ["renderer", "size", "p50_ms", "p95_ms", "p99_ms", "throughput_per_core", "peak_memory_kb"],
+    )
+
+    if args.save_baseline:
+        save_baseline(BASELINE_NAME, results)
+        print(f"\nBaseline '{BASELINE_NAME}' saved")
+        return 0
+
+    baseline = load_baseline(BASELINE_NAME)
+    if baseline is None:
+        print("\nNo baseline for this machine yet, run with --save-baseline to record one")
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, REGRESSION_METRICS, args.tolerance)
+    if regressions:
+        print(f"\nRegressions (> {args.tolerance:.0%} vs baseline):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
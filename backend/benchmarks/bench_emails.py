@@ -0,0 +1,200 @@
+"""
+Email throughput benchmark against the local SMTP sink.
+
+Usage (from the backend directory):
+    python benchmarks/bench_emails.py --save-baseline          # record the baseline of this machine
+    python benchmarks/bench_emails.py                          # compare with it
+    python benchmarks/bench_emails.py --messages 5000 --latency 0.005 --failure-rate 0.01
+
+Scenarios:
+    bulk_serial  EmailService.send_bulk_emails, one message after the other
+    bulk_async   AsyncBulkSender with --concurrency workers, batched by domain like the outbox
+    welcome      welcome emails with the shared lead magnet attachment, concurrent
+
+For each it reports messages/sec (recipients accepted by the sink per second),
+SMTP connections opened, and p50/p99 latency of a single SMTP transaction.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Dict, Any, List
+
+from common import (
+    add_app_to_path,
+    summarize_latencies,
+    load_baseline,
+    save_baseline,
+    compare_to_baseline,
+    print_table,
+)
+from smtp_sink import SMTPSink
+
+add_app_to_path()
+from services.smtpPool import SMTPConnectionPool  # noqa: E402
+from services.emails import EmailService  # noqa: E402
+from services.assetsSevice import AssetService  # noqa: E402
+from services.bulkSender import AsyncBulkSender, RateLimiter, email_domain, plan_domain_batches  # noqa: E402
+from bench_assets import make_lead_magnet  # noqa: E402
+
+BASELINE_NAME = "emails"
+SCENARIOS = ["bulk_serial", "bulk_async", "welcome"]
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "example.com"]
+
+REGRESSION_METRICS = {
+    "messages_per_sec": "higher",
+    "p99_ms": "lower",
+}
+
+
+class TimedPool(SMTPConnectionPool):
+    """Pool recording the duration of every SMTP transaction"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies: List[float] = []
+
+    def send_message(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().send_message(*args, **kwargs)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+
+def make_leads(count: int) -> List[Dict[str, Any]]:
+    return [
+        {"id": i, "name": f"Lead {i}", "email": f"lead{i}@{DOMAINS[i % len(DOMAINS)]}"}
+        for i in range(count)
+    ]
+
+
+def make_service(sink: SMTPSink, pool_size: int) -> EmailService:
+    pool = TimedPool(sink.host, sink.port, None, None, max_size=pool_size, use_tls=False)
+    service = EmailService(pool=pool)
+    service.from_email = "bench@example.com"
+    return service
+
+
+def unlimited_sender(service: EmailService, concurrency: int) -> AsyncBulkSender:
+    # rate limits would measure the limiter, not the sender
+    return AsyncBulkSender(
+        service,
+        concurrency=concurrency,
+        rate_limiter=RateLimiter({}, 0),
+        domain_limiter=RateLimiter({}, 0),
+    )
+
+
+async def send_campaign(sender: AsyncBulkSender, leads: List[Dict[str, Any]], template: Dict[str, Any]):
+    """Send template to every lead the way the outbox dispatcher sends a campaign"""
+    shared = not sender.email_service.is_personalized(template)
+    batches = plan_domain_batches(
+        leads,
+        email_of=lambda lead: lead["email"],
+        share_key=lambda lead: "template" if shared else None
+    )
+    await sender.run(
+        batches,
+        lambda batch: not sender.email_service.send_nurture_email_batch(batch, template),
+        domain_of=lambda batch: email_domain(batch[0]["email"]),
+        recipients_of=len
+    )
+
+
+def run_scenario(name: str, sink: SMTPSink, messages: int, concurrency: int, template: Dict[str, Any]) -> Dict[str, float]:
+    service = make_service(sink, pool_size=concurrency)
+    leads = make_leads(messages)
+    sink.handler.reset()
+    started = time.perf_counter()
+
+    if name == "bulk_serial":
+        service.send_bulk_emails(leads, template)
+    elif name == "bulk_async":
+        sender = unlimited_sender(service, concurrency)
+        asyncio.run(send_campaign(sender, leads, template))
+        sender.close()
+    elif name == "welcome":
+        asset_service = AssetService()
+        lead_magnet = make_lead_magnet("checklist", 20)
+        sender = unlimited_sender(service, concurrency)
+
+        def send_welcome(lead):
+            part = service.get_lead_magnet_attachment(lead_magnet, asset_service.generate_asset)
+            return service.send_welcome_email(lead, lead_magnet, attachment_part=part)
+
+        asyncio.run(sender.run(leads, send_welcome))
+        sender.close()
+    else:
+        raise ValueError(f"Unknown scenario: {name}")
+
+    elapsed = time.perf_counter() - started
+    service.pool.close()
+    sink_stats = sink.handler.stats()
+    stats = summarize_latencies(service.pool.latencies)
+    return {
+        "messages": messages,
+        "delivered": sink_stats["recipients"],
+        "failed": messages - sink_stats["recipients"],
+        "seconds": elapsed,
+        "messages_per_sec": sink_stats["recipients"] / elapsed if elapsed else 0.0,
+        "connections": sink_stats["connections"],
+        "transactions": sink_stats["transactions"],
+        "p50_ms": stats["p50_ms"],
+        "p99_ms": stats["p99_ms"],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark EmailService throughput")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0, help="sink delay per message (seconds)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of messages the sink rejects")
+    parser.add_argument("--shared-template", action="store_true",
+                        help="use a template without {name} so recipients can share transactions")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    body = "Here is a tip for you.\nHave a great day!"
+    if not args.shared_template:
+        body = "Hi {name},\n" + body
+    template = {"subject": "Benchmark", "body": body, "sequence_number": 1}
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    with SMTPSink(port=args.port, latency=args.latency, failure_rate=args.failure_rate) as sink:
+        for name in args.scenarios:
+            results[name] = {str(args.messages): run_scenario(name, sink, args.messages, args.concurrency, template)}
+
+    rows = [{"scenario": name, **sizes[str(args.messages)]} for name, sizes in results.items()]
+    print_table(
+        f"Email throughput ({args.messages} messages, concurrency {args.concurrency}, "
+        f"sink latency {args.latency}s, failure rate {args.failure_rate})",
+        rows,
+        ["scenario", "delivered", "failed", "messages_per_sec", "connections", "transactions", "p50_ms", "p99_ms"],
+    )
+
+    if args.save_baseline:
+        save_baseline(BASELINE_NAME, results)
+        print(f"\nBaseline '{BASELINE_NAME}' saved")
+        return 0
+
+    baseline = load_baseline(BASELINE_NAME)
+    if baseline is None:
+        print("\nNo baseline for this machine yet, run with --save-baseline to record one")
+        return 0
+    regressions = compare_to_baseline(results, baseline, REGRESSION_METRICS, args.tolerance)
+    if regressions:
+        print(f"\nRegressions (> {args.tolerance:.0%} vs baseline):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
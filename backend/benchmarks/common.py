@@ -0,0 +1,126 @@
+"""Shared helpers for the benchmark scripts (stats, baselines, reporting)."""
+import json
+import math
+import os
+import platform
+import sys
+from typing import Dict, Any, List, Optional
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINES_DIR = os.path.join(BENCHMARKS_DIR, "baselines")
+APP_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), "app")
+
+
+def add_app_to_path():
+    """Make the app modules importable the same way uvicorn sees them"""
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples (seconds) into milliseconds percentiles"""
+    total = sum(samples)
+    return {
+        "count": len(samples),
+        "mean_ms": (total / len(samples)) * 1000 if samples else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+    }
+
+
+def baseline_path(name: str) -> str:
+    return os.path.join(BASELINES_DIR, f"{name}.json")
+
+
+def machine_info() -> Dict[str, Any]:
+    """What the timings depend on; baselines are only compared on the machine that recorded them"""
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+
+
+def load_baseline(name: str) -> Optional[Dict[str, Any]]:
+    """
+    Load the baseline recorded on this machine, or None if there is none.
+    Baselines hold absolute timings, so they are not committed: record one
+    locally with --save-baseline before comparing.
+    """
+    path = baseline_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        stored = json.load(f)
+    if stored.get("machine") != machine_info():
+        return None
+    return stored["results"]
+
+
+def save_baseline(name: str, results: Dict[str, Any]):
+    """Store results as the new baseline of this machine"""
+    os.makedirs(BASELINES_DIR, exist_ok=True)
+    with open(baseline_path(name), "w") as f:
+        json.dump({"machine": machine_info(), "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Dict[str, Dict[str, Dict[str, float]]],
+    metrics: Dict[str, str],
+    tolerance: float
+) -> List[str]:
+    """
+    Compare results against a baseline, both shaped {case: {size: {metric: value}}}.
+    metrics maps a metric name to "lower" or "higher" (which direction is better).
+    Returns a human readable line for every metric that regressed by more than tolerance.
+    """
+    regressions = []
+    for case, sizes in results.items():
+        for size, values in sizes.items():
+            base_values = baseline.get(case, {}).get(size)
+            if not base_values:
+                continue
+            for metric, better in metrics.items():
+                current = values.get(metric)
+                previous = base_values.get(metric)
+                if current is None or not previous:
+                    continue
+                change = (current - previous) / previous
+                if better == "higher":
+                    change = -change
+                if change > tolerance:
+                    regressions.append(
+                        f"{case} [{size}] {metric}: {previous:.2f} -> {current:.2f} ({change:+.0%})"
+                    )
+    return regressions
+
+
+def print_table(title: str, rows: List[Dict[str, Any]], columns: List[str]):
+    """Print rows as a fixed width table"""
+    print(f"\n{title}")
+    widths = {c: max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    print("  ".join("-" * widths[c] for c in columns))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).ljust(widths[c]) for c in columns))
+
+
+def _fmt(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
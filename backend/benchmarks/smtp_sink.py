@@ -0,0 +1,114 @@
+"""
+Local SMTP sink for benchmarks and manual testing, built on aiosmtpd.
+
+Accepts every message and throws it away, optionally after a delay and with
+random temporary failures. aiosmtpd is a benchmark only dependency
+(pip install -r benchmarks/requirements.txt). Run the sink standalone and
+point the app at it:
+
+    python benchmarks/smtp_sink.py --port 8025 --latency 0.02 --failure-rate 0.01
+    SMTP_SERVER=127.0.0.1 SMTP_PORT=8025 SMTP_USE_TLS=false uvicorn main:app
+"""
+import argparse
+import asyncio
+import logging
+import random
+import threading
+import time
+from aiosmtpd.controller import Controller
+
+# aiosmtpd logs every command at INFO
+logging.getLogger("mail.log").setLevel(logging.WARNING)
+
+
+class SinkHandler:
+    """aiosmtpd handler that counts connections, transactions and recipients"""
+
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections = 0
+            self.transactions = 0
+            self.recipients = 0
+            self.failures = 0
+            self.bytes_received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        # one EHLO per connection (smtplib only repeats it after STARTTLS)
+        with self._lock:
+            self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        with self._lock:
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                self.failures += 1
+                return "451 4.3.0 Injected temporary failure"
+            self.transactions += 1
+            self.recipients += len(envelope.rcpt_tos)
+            self.bytes_received += len(envelope.content or b"")
+        return "250 OK"
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "transactions": self.transactions,
+                "recipients": self.recipients,
+                "failures": self.failures,
+                "bytes_received": self.bytes_received,
+            }
+
+
+class SMTPSink:
+    """Runs a SinkHandler on a background thread; usable as a context manager"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025, latency: float = 0.0, failure_rate: float = 0.0):
+        self.host = host
+        self.port = port
+        self.handler = SinkHandler(latency=latency, failure_rate=failure_rate)
+        self.controller = Controller(self.handler, hostname=host, port=port)
+
+    def start(self):
+        self.controller.start()
+        return self
+
+    def stop(self):
+        self.controller.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering DATA")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of messages answered with 451")
+    args = parser.parse_args()
+
+    with SMTPSink(args.host, args.port, args.latency, args.failure_rate) as sink:
+        print(f"SMTP sink listening on {args.host}:{args.port} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(10)
+                print(sink.handler.stats())
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()